@@ -6,23 +6,39 @@
 from __future__ import annotations
 
 import json
+import atexit
+import functools
 import logging
+import os
+import string
 import sys
 import threading
+import time
+import weakref
 from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import TYPE_CHECKING, Any
 
 from pydantic import BaseModel, Field
 
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时回退到标准库 json
+    orjson = None
+
 from .context import ContextConfig, ContextManager
 from evomaster.utils.types import (
     AssistantMessage,
     Dialog,
+    Message,
     StepRecord,
     SystemMessage,
     TaskInstance,
     ToolMessage,
+    ToolSpec,
+    Trajectory,
     UserMessage,
 )
 
@@ -33,6 +49,148 @@ if TYPE_CHECKING:
     from evomaster.skills import SkillRegistry
 
 
+logger = logging.getLogger(__name__)
+
+# 日志分隔线
+_BAR = "=" * 80
+_DASH60 = "-" * 60
+
+# 写入对话的工具输出最大字符数，防止 context 溢出
+MAX_TOOL_OUTPUT = 30000
+
+
+def _truncate_middle(text: str, limit: int, marker: str = "\n... [truncated] ...\n") -> str:
+    """截断过长的文本：超过 limit 个字符时保留首尾各 limit // 2 个字符
+
+    未超过 limit 时直接返回原字符串，不产生拷贝。
+    """
+    if len(text) <= limit:
+        return text
+    half = limit // 2
+    return "".join((text[:half], marker, text[-half:]))
+
+
+def _write_console(text: str) -> None:
+    """将一整块控制台输出一次写入 stdout 并刷新，避免多次 print 的逐行写入"""
+    sys.stdout.write(text + "\n")
+    sys.stdout.flush()
+
+
+@functools.lru_cache(maxsize=64)
+def _read_prompt_file(path: str, mtime_ns: int) -> str:
+    """读取提示词文件，按 (路径, 修改时间) 缓存，文件修改后自动重新读取"""
+    return Path(path).read_text(encoding="utf-8")
+
+
+_FORMATTER = string.Formatter()
+
+
+@functools.lru_cache(maxsize=32)
+def _parse_template(template: str) -> tuple[tuple[str, str | None, str, str | None], ...] | None:
+    """预解析 str.format 模板，解析结果按模板缓存
+
+    只处理关键字占位符；包含位置参数占位符（{}、{0}）或嵌套格式说明的模板返回 None，
+    由调用方回退到 str.format。
+    """
+    parts = tuple(_FORMATTER.parse(template))
+    for _, field_name, format_spec, _ in parts:
+        if field_name is None:
+            continue
+        first = field_name.split(".", 1)[0].split("[", 1)[0]
+        if not first or first.isdigit() or "{" in (format_spec or ""):
+            return None
+    return parts
+
+
+def _format_template(template: str, kwargs: dict[str, Any]) -> str:
+    """格式化模板，结果与 template.format(**kwargs) 一致
+
+    模板只解析一次，之后每次只做字段查找和拼接，避免 str.format 每次重新扫描整个模板。
+    缺少参数时同样抛出 KeyError。
+    """
+    parts = _parse_template(template)
+    if parts is None:
+        return template.format(**kwargs)
+
+    pieces = []
+    for literal, field_name, format_spec, conversion in parts:
+        pieces.append(literal)
+        if field_name is None:
+            continue
+        value, _ = _FORMATTER.get_field(field_name, (), kwargs)
+        value = _FORMATTER.convert_field(value, conversion)
+        pieces.append(format(value, format_spec or ""))
+    return "".join(pieces)
+
+
+def _dumps_jsonl(obj: Any) -> bytes:
+    """将对象序列化为一行 JSONL（UTF-8 编码，以换行结尾）"""
+    if orjson is not None:
+        return orjson.dumps(
+            obj,
+            default=str,
+            option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS,
+        )
+    return (json.dumps(obj, default=str, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _loads_json(data: str | bytes) -> Any:
+    """解析 JSON 字符串，优先使用 orjson"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+# shutdown_trajectory_writer 是否已注册为 atexit 钩子（写入线程重启时不重复注册）
+_trajectory_atexit_registered = False
+
+
+# 并发执行 concurrent_safe 工具的共享线程池（首次使用时创建）
+_TOOL_EXECUTOR_WORKERS = 8
+_tool_executor: ThreadPoolExecutor | None = None
+_tool_executor_lock = threading.Lock()
+
+
+def _get_tool_executor() -> ThreadPoolExecutor:
+    """获取共享的工具执行线程池"""
+    global _tool_executor
+    if _tool_executor is None:
+        with _tool_executor_lock:
+            if _tool_executor is None:
+                _tool_executor = ThreadPoolExecutor(
+                    max_workers=_TOOL_EXECUTOR_WORKERS,
+                    thread_name_prefix="agent-tool",
+                )
+    return _tool_executor
+
+
+try:
+    _IOV_MAX = os.sysconf("SC_IOV_MAX")
+except (AttributeError, ValueError, OSError):
+    _IOV_MAX = 16
+
+
+def _write_buffers(fd: int, buffers: list[bytes]) -> None:
+    """将多个缓冲区依次写入文件描述符
+
+    支持 writev 时直接提交缓冲区列表，避免拼接产生的额外拷贝。
+    """
+    if not hasattr(os, "writev"):
+        data = memoryview(b"".join(buffers))
+        while data:
+            data = data[os.write(fd, data):]
+        return
+
+    for start in range(0, len(buffers), _IOV_MAX):
+        chunk = buffers[start:start + _IOV_MAX]
+        written = os.writev(fd, chunk)
+        if written < sum(map(len, chunk)):
+            # 部分写入时，逐段写完剩余数据
+            data = memoryview(b"".join(chunk))[written:]
+            while data:
+                data = data[os.write(fd, data):]
+
+
 class AgentConfig(BaseModel):
     """Agent 配置"""
     max_turns: int = Field(default=100, description="最大执行轮数")
@@ -62,6 +220,14 @@ class BaseAgent(ABC):
     _trajectory_file_path: Path | None = None
     _trajectory_file_lock = threading.Lock()
 
+    # 类级别的轨迹提交通道 (提交队列, 唤醒事件, 关闭事件) 和后台写入线程
+    # （所有agent实例共享，首次写入时启动；通道放在一个元组中，提交方一次读取即可得到同一代的三者）
+    _trajectory_channel: tuple[deque, threading.Event, threading.Event] | None = None
+    _trajectory_writer: threading.Thread | None = None
+    # 后台线程的合并写入阈值：缓冲达到该字节数，或距第一条缓冲条目超过该秒数时写入
+    _TRAJECTORY_FLUSH_BYTES = 64 * 1024
+    _TRAJECTORY_FLUSH_INTERVAL = 0.05
+
     # 类级别的当前exp信息（所有agent实例共享）
     _current_exp_name: str | None = None
     _current_exp_index: int | None = None
@@ -126,6 +292,15 @@ class BaseAgent(ABC):
         # Agent名称（用于标识不同的agent）
         self._agent_name: str | None = None
 
+        # 消息序列化缓存：id(model) -> (弱引用, model_dump 结果)
+        # 对话中的消息在追加后不再修改，每条消息只需 model_dump 一次
+        self._dump_cache: dict[int, tuple[weakref.ref, dict[str, Any]]] = {}
+        # 对话增量序列化状态：(对话弱引用, 已序列化消息数, 最后一条已序列化消息, 已序列化消息列表)
+        self._dialog_dump_state: tuple[weakref.ref, int, Message, list[dict[str, Any]]] | None = None
+
+        # 工具规格缓存：(工具注册中心, 注册中心版本号, 工具规格列表)
+        self._tool_specs_cache: tuple[ToolRegistry, int, list[ToolSpec]] | None = None
+
     def run(self, task: TaskInstance):
         """执行任务
 
@@ -135,9 +310,7 @@ class BaseAgent(ABC):
         Returns:
             执行轨迹
         """
-        from evomaster.utils.types import Trajectory
-
-        self.logger.info(f"Starting task: {task.task_id}")
+        self.logger.info("Starting task: %s", task.task_id)
 
         # 初始化
         self._initialize(task)
@@ -146,27 +319,19 @@ class BaseAgent(ABC):
             # 执行循环
             for turn in range(self.config.max_turns):
                 # 清晰显示当前步骤
-                self.logger.info("=" * 80)
-                self.logger.info(f"📍 Step [{turn + 1}/{self.config.max_turns}]")
-                self.logger.info("=" * 80)
+                self.logger.info("%s\n📍 Step [%d/%d]\n%s", _BAR, turn + 1, self.config.max_turns, _BAR)
 
                 should_finish = self._step()
                 if should_finish:
-                    self.logger.info("=" * 80)
-                    self.logger.info("✅ Agent finished task")
-                    self.logger.info("=" * 80)
+                    self.logger.info("%s\n✅ Agent finished task\n%s", _BAR, _BAR)
                     self.trajectory.finish("completed")
                     break
             else:
-                self.logger.warning("=" * 80)
-                self.logger.warning("⚠️  Reached max turns limit")
-                self.logger.warning("=" * 80)
+                self.logger.warning("%s\n⚠️  Reached max turns limit\n%s", _BAR, _BAR)
                 self.trajectory.finish("failed", {"reason": "max_turns_exceeded"})
 
         except Exception as e:
-            self.logger.error("=" * 80)
-            self.logger.error(f"❌ Agent execution failed: {e}")
-            self.logger.error("=" * 80)
+            self.logger.error("%s\n❌ Agent execution failed: %s\n%s", _BAR, e, _BAR)
             self.trajectory.finish("failed", {"reason": str(e)})
             raise
 
@@ -178,8 +343,6 @@ class BaseAgent(ABC):
         Args:
             task: 任务实例
         """
-        from evomaster.utils.types import Trajectory
-
         # 创建轨迹
         self.trajectory = Trajectory(
             task_id=task.task_id,
@@ -236,7 +399,7 @@ class BaseAgent(ABC):
             # 检查Agent是否启用了工具调用
             # 如果没有启用工具（enable_tools=False），则直接结束
             # 因为这种Agent只需要给出回答，不需要工具调用
-            if hasattr(self, 'enable_tools') and not self.enable_tools:
+            if not self.enable_tools:
                 self.trajectory.add_step(step_record)
                 # 追加保存本次step到轨迹文件（包含tool_responses）
                 self._append_trajectory_entry(dialog_for_query, step_record)
@@ -249,43 +412,18 @@ class BaseAgent(ABC):
             self._append_trajectory_entry(dialog_for_query, step_record)
             return False
 
-        # 处理工具调用
-        should_finish = False
-        for tool_call in assistant_message.tool_calls:
-            self.logger.debug(f"Processing tool call: {tool_call.function.name}")
-
-            # 检查是否是 finish 工具
+        # 处理工具调用：finish 之前的调用会被执行，finish 之后的调用被忽略
+        tool_calls = assistant_message.tool_calls
+        finish_call = None
+        for index, tool_call in enumerate(tool_calls):
             if tool_call.function.name == "finish":
-                # 打印 finish 工具的参数（最终答案）
-                try:
-                    import json
-                    finish_args = json.loads(tool_call.function.arguments)
-                    self.logger.info("=" * 80)
-                    self.logger.info("📝 Finish Tool Arguments:")
-                    for key, value in finish_args.items():
-                        # 截断过长的值用于显示
-                        value_str = str(value)
-                        if len(value_str) > 2000:
-                            value_str = value_str[:1000] + "\n... [truncated] ...\n" + value_str[-1000:]
-                        self.logger.info(f"  {key}: {value_str}")
-                    self.logger.info("=" * 80)
-                except Exception as e:
-                    self.logger.info(f"📝 Finish Tool Raw Args: {tool_call.function.arguments}")
-                should_finish = True
+                finish_call = tool_call
+                tool_calls = tool_calls[:index]
                 break
 
-            # 执行工具
-            observation, info = self._execute_tool(tool_call)
-
-            # 截断过长的工具输出，防止 context 溢出
-            MAX_TOOL_OUTPUT = 30000
-            if len(observation) > MAX_TOOL_OUTPUT:
-                observation = (
-                    observation[:MAX_TOOL_OUTPUT // 2]
-                    + "\n\n... [output truncated due to length] ...\n\n"
-                    + observation[-MAX_TOOL_OUTPUT // 2:]
-                )
-
+        # 执行工具（返回的输出已按 MAX_TOOL_OUTPUT 截断）
+        results = self._execute_tool_calls(tool_calls)
+        for tool_call, (observation, info) in zip(tool_calls, results):
             # 创建工具响应消息
             tool_message = ToolMessage(
                 content=observation,
@@ -297,14 +435,68 @@ class BaseAgent(ABC):
             self.current_dialog.add_message(tool_message)
             step_record.tool_responses.append(tool_message)
 
+        should_finish = finish_call is not None
+        if should_finish and self.logger.isEnabledFor(logging.INFO):
+            # 打印 finish 工具的参数（最终答案），参数只用于显示，INFO 关闭时不解析
+            self._log_finish_args(finish_call.function.arguments)
+
         self.trajectory.add_step(step_record)
         # 追加保存本次step到轨迹文件（包含tool_responses）
         self._append_trajectory_entry(dialog_for_query, step_record)
         return should_finish
 
+    def _execute_tool_calls(self, tool_calls: list) -> list[tuple[str, dict[str, Any]]]:
+        """执行一组工具调用，结果顺序与调用顺序一致
+
+        连续的 concurrent_safe 工具调用（如通过网络访问远程服务的 MCP 工具）提交到共享
+        线程池并发执行，耗时取决于其中最慢的调用而不是总和；其他工具共享 session 状态，
+        按顺序逐个执行，与前后调用之间的先后关系不变。
+
+        Args:
+            tool_calls: 工具调用列表
+
+        Returns:
+            与 tool_calls 一一对应的 (observation, info) 列表
+        """
+        results: list[tuple[str, dict[str, Any]]] = []
+        batch: list = []
+
+        def run_batch() -> None:
+            if len(batch) == 1:
+                results.append(self._execute_tool(batch[0]))
+            elif batch:
+                results.extend(_get_tool_executor().map(self._execute_tool, batch))
+            batch.clear()
+
+        for tool_call in tool_calls:
+            self.logger.debug("Processing tool call: %s", tool_call.function.name)
+            tool = self.tools.get_tool(tool_call.function.name)
+            if tool is not None and tool.concurrent_safe:
+                batch.append(tool_call)
+                continue
+            run_batch()
+            results.append(self._execute_tool(tool_call))
+        run_batch()
+        return results
+
+    def _log_finish_args(self, arguments: str) -> None:
+        """记录 finish 工具的参数，过长的值截断显示"""
+        try:
+            finish_args = _loads_json(arguments)
+            lines = [_BAR, "📝 Finish Tool Arguments:"]
+            for key, value in finish_args.items():
+                lines.append(f"  {key}: {_truncate_middle(str(value), 2000)}")
+            lines.append(_BAR)
+            self.logger.info("\n".join(lines))
+        except Exception:
+            self.logger.info("📝 Finish Tool Raw Args: %s", arguments)
+
     def _execute_tool(self, tool_call) -> tuple[str, dict[str, Any]]:
         """执行工具调用
 
+        工具输出在返回前截断到 MAX_TOOL_OUTPUT 个字符，防止 context 溢出；
+        日志显示基于截断后的输出，不再对完整输出做第二次截断。
+
         Args:
             tool_call: 工具调用
 
@@ -327,57 +519,55 @@ class BaseAgent(ABC):
         try:
             # 执行工具
             observation, info = tool.execute(self.session, tool_args)
-            
+
+            # 截断过长的工具输出，防止 context 溢出
+            observation = _truncate_middle(
+                observation, MAX_TOOL_OUTPUT, "\n\n... [output truncated due to length] ...\n\n"
+            )
+
             # 记录工具调用结束
             self._log_tool_end(tool_name, observation, info)
             
             return observation, info
         except Exception as e:
             error_msg = f"Tool execution error: {str(e)}"
-            self.logger.error(f"Tool execution failed: {e}", exc_info=True)
+            self.logger.error("Tool execution failed: %s", e, exc_info=True)
             self._log_tool_end(tool_name, error_msg, {"error": str(e)})
             return error_msg, {"error": str(e)}
 
     def _log_tool_start(self, tool_name: str, tool_args: str) -> None:
         """记录工具调用开始"""
         if self.log_to_file:
-            self.logger.info("=" * 80)
-            self.logger.info(f"Tool Call Start: {tool_name}")
-            self.logger.info(f"Arguments: {tool_args}")
-            self.logger.info("=" * 80)
+            self.logger.info("%s\nTool Call Start: %s\nArguments: %s\n%s", _BAR, tool_name, tool_args, _BAR)
         
         if self.show_in_console:
-            print(f"\n[Tool Call] {tool_name}")
+            lines = [f"\n[Tool Call] {tool_name}"]
             if tool_args:
                 # 尝试格式化JSON参数
                 try:
-                    import json
                     args_dict = json.loads(tool_args)
-                    print(f"  Arguments: {json.dumps(args_dict, indent=2, ensure_ascii=False)}")
+                    lines.append(f"  Arguments: {json.dumps(args_dict, indent=2, ensure_ascii=False)}")
                 except:
-                    print(f"  Arguments: {tool_args}")
-            print("-" * 60)
+                    lines.append(f"  Arguments: {tool_args}")
+            lines.append(_DASH60)
+            _write_console("\n".join(lines))
 
     def _log_tool_end(self, tool_name: str, observation: str, info: dict[str, Any]) -> None:
         """记录工具调用结束"""
         # 截断过长的输出：超过5000字符时，保留前2500和最后2500
-        obs_display = observation
-        if len(obs_display) > 5000:
-            obs_display = obs_display[:2500] + "\n... [truncated] ...\n" + obs_display[-2500:]
-        
+        obs_display = _truncate_middle(observation, 5000)
+
         if self.log_to_file:
-            self.logger.info("=" * 80)
-            self.logger.info(f"Tool Call End: {tool_name}")
-            self.logger.info(f"Output: {obs_display}")
             if info:
-                self.logger.info(f"Info: {info}")
-            self.logger.info("=" * 80)
+                self.logger.info(
+                    "%s\nTool Call End: %s\nOutput: %s\nInfo: %s\n%s",
+                    _BAR, tool_name, obs_display, info, _BAR,
+                )
+            else:
+                self.logger.info("%s\nTool Call End: %s\nOutput: %s\n%s", _BAR, tool_name, obs_display, _BAR)
         
         if self.show_in_console:
-            print(f"\n[Tool Output] {tool_name}")
-            print("-" * 60)
-            print(obs_display)
-            print("-" * 60)
+            _write_console(f"\n[Tool Output] {tool_name}\n{_DASH60}\n{obs_display}\n{_DASH60}")
 
     def _handle_no_tool_call(self) -> None:
         """处理没有工具调用的情况"""
@@ -400,7 +590,13 @@ class BaseAgent(ABC):
             return []
         if self.tools is None:
             return []
-        return self.tools.get_tool_specs()
+        # 工具注册中心未变化时复用上次生成的规格列表
+        cached = self._tool_specs_cache
+        if cached is not None and cached[0] is self.tools and cached[1] == self.tools.version:
+            return cached[2]
+        tool_specs = self.tools.get_tool_specs()
+        self._tool_specs_cache = (self.tools, self.tools.version, tool_specs)
+        return tool_specs
 
     def load_prompt_from_file(
         self,
@@ -433,29 +629,30 @@ class BaseAgent(ABC):
                 )
             prompt_path = self.config_dir / prompt_file
 
-        # 读取文件内容
-        if not prompt_path.exists():
+        # 读取文件内容（stat 同时用于判断文件是否存在和缓存失效）
+        try:
+            mtime_ns = prompt_path.stat().st_mtime_ns
+        except FileNotFoundError:
             raise FileNotFoundError(
                 f"Prompt file not found: {prompt_path}\n"
                 f"Please create the file or check the path."
-            )
+            ) from None
 
         try:
-            with open(prompt_path, 'r', encoding='utf-8') as f:
-                prompt_content = f.read()
+            prompt_content = _read_prompt_file(str(prompt_path), mtime_ns)
 
             # 如果提供了format_kwargs，进行格式化
             if format_kwargs:
                 try:
-                    prompt_content = prompt_content.format(**format_kwargs)
+                    prompt_content = _format_template(prompt_content, format_kwargs)
                 except KeyError as e:
                     self.logger.warning(
-                        f"Format key {e} not found in format_kwargs. "
-                        f"Available keys: {list(format_kwargs.keys())}"
+                        "Format key %s not found in format_kwargs. Available keys: %s",
+                        e, list(format_kwargs.keys()),
                     )
                     raise
 
-            self.logger.debug(f"Loaded prompt from: {prompt_path}")
+            self.logger.debug("Loaded prompt from: %s", prompt_path)
             return prompt_content
         except Exception as e:
             raise RuntimeError(f"Failed to load prompt from {prompt_path}: {e}")
@@ -500,7 +697,8 @@ class BaseAgent(ABC):
 
         user_message = UserMessage(content=content)
         self.current_dialog.add_message(user_message)
-        self.logger.debug(f"Added user message: {content[:50]}...")
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Added user message: %s...", content[:50])
 
     def add_assistant_message(self, content: str, tool_calls: list | None = None) -> None:
         """添加助手消息到当前对话
@@ -516,8 +714,9 @@ class BaseAgent(ABC):
 
         assistant_message = AssistantMessage(content=content, tool_calls=tool_calls or [])
         self.current_dialog.add_message(assistant_message)
-        content_preview = content[:50] if content else "(empty)"
-        self.logger.debug(f"Added assistant message: {content_preview}...")
+        if self.logger.isEnabledFor(logging.DEBUG):
+            content_preview = content[:50] if content else "(empty)"
+            self.logger.debug("Added assistant message: %s...", content_preview)
 
     def add_tool_message(
         self,
@@ -546,7 +745,7 @@ class BaseAgent(ABC):
             meta=meta or {},
         )
         self.current_dialog.add_message(tool_message)
-        self.logger.debug(f"Added tool message: {name}")
+        self.logger.debug("Added tool message: %s", name)
 
     def set_next_user_request(self, content: str) -> None:
         """设置下一次对话的用户请求
@@ -566,15 +765,17 @@ class BaseAgent(ABC):
         """
         return self.current_dialog
 
-    def get_conversation_history(self) -> list:
+    def get_conversation_history(self) -> tuple[Message, ...]:
         """获取对话历史
 
+        返回当前消息的只读快照（tuple），需要修改时请自行转换为 list。
+
         Returns:
-            消息列表
+            消息元组
         """
         if self.current_dialog is None:
-            return []
-        return self.current_dialog.messages.copy()
+            return ()
+        return tuple(self.current_dialog.messages)
     
     @classmethod
     def set_trajectory_file_path(cls, trajectory_file_path: str | Path) -> None:
@@ -587,6 +788,216 @@ class BaseAgent(ABC):
         # 确保目录存在
         cls._trajectory_file_path.parent.mkdir(parents=True, exist_ok=True)
 
+    @classmethod
+    def _submit_trajectory_line(cls, path: Path, line: bytes) -> None:
+        """提交一行轨迹给后台写入线程（必要时启动线程）
+
+        提交只做 deque.append 和唤醒，不获取锁。锁只在写入线程尚未启动或已开始退出
+        （关闭事件已设置）时使用：写入线程退出前会写完关闭事件设置之前提交的条目，
+        之后提交的条目由提交方转交给新启动的写入线程，不会丢失。
+
+        Args:
+            path: 目标轨迹文件路径
+            line: 已序列化的 JSONL 行
+        """
+        channel = BaseAgent._trajectory_channel
+        if channel is None:
+            BaseAgent._restart_trajectory_writer(None, (path, line))
+            return
+        pending, wake, closed = channel
+        pending.append((path, line))
+        if not wake.is_set():
+            wake.set()
+        if closed.is_set():
+            BaseAgent._restart_trajectory_writer(pending, None)
+
+    @classmethod
+    def _restart_trajectory_writer(cls, stale: deque | None, item: tuple[Path, bytes] | None) -> None:
+        """在锁内按需启动新的写入线程，并把已关闭通道中未写入的条目转交给它
+
+        Args:
+            stale: 已关闭通道的提交队列，其中剩余的条目没有被旧线程写入
+            item: 需要提交的条目
+        """
+        global _trajectory_atexit_registered
+        with BaseAgent._trajectory_file_lock:
+            channel = BaseAgent._trajectory_channel
+            if channel is None or channel[2].is_set():
+                channel = (deque(), threading.Event(), threading.Event())
+                writer = threading.Thread(
+                    target=BaseAgent._trajectory_writer_loop,
+                    args=channel,
+                    name="trajectory-writer",
+                    daemon=True,
+                )
+                writer.start()
+                BaseAgent._trajectory_channel = channel
+                BaseAgent._trajectory_writer = writer
+                if not _trajectory_atexit_registered:
+                    atexit.register(BaseAgent.shutdown_trajectory_writer)
+                    _trajectory_atexit_registered = True
+
+            pending, wake, _ = channel
+            if stale is not None and stale is not pending:
+                # popleft 是原子的：旧线程最后一次取数据时取走的条目不会被重复转交
+                while True:
+                    try:
+                        stale_item = stale.popleft()
+                    except IndexError:
+                        break
+                    if stale_item is not None:
+                        pending.append(stale_item)
+            if item is not None:
+                pending.append(item)
+            wake.set()
+
+    @staticmethod
+    def _trajectory_writer_loop(pending: deque, wake: threading.Event, closed: threading.Event) -> None:
+        """后台写入线程主循环（group commit）
+
+        生产者通过 deque 提交条目（append/popleft 在 GIL 下是原子的），并用 Event 唤醒
+        本线程。条目先缓存在内存中，直到缓冲达到 _TRAJECTORY_FLUSH_BYTES 字节、距第一条
+        缓冲条目超过 _TRAJECTORY_FLUSH_INTERVAL 秒、目标文件切换、遇到 flush 标记
+        （threading.Event）或 None（退出）时，才通过一次 writev 追加到文件。
+
+        遇到 None 时先设置 closed，再写完队列中剩余的条目后退出；设置 closed 之后
+        提交的条目由提交方转交给新的写入线程。
+        """
+        fd: int | None = None
+        fd_path: Path | None = None
+        buffers: list[bytes] = []
+        buffer_path: Path | None = None
+        buffer_size = 0
+        deadline = 0.0
+
+        def flush() -> None:
+            nonlocal fd, fd_path, buffers, buffer_path, buffer_size
+            if not buffers:
+                return
+            try:
+                if buffer_path != fd_path:
+                    if fd is not None:
+                        os.close(fd)
+                        fd, fd_path = None, None
+                    fd = os.open(buffer_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                    fd_path = buffer_path
+                _write_buffers(fd, buffers)
+            except OSError as e:
+                logger.warning("Failed to write trajectory file %s: %s", buffer_path, e)
+                if fd is not None:
+                    os.close(fd)
+                fd, fd_path = None, None
+            finally:
+                buffers, buffer_path, buffer_size = [], None, 0
+
+        def handle(item: tuple[Path, bytes] | threading.Event) -> None:
+            nonlocal buffer_path, buffer_size, deadline
+            if isinstance(item, threading.Event):
+                flush()
+                item.set()
+                return
+
+            path, line = item
+            if buffers and path != buffer_path:
+                flush()
+            if not buffers:
+                buffer_path = path
+                deadline = time.monotonic() + BaseAgent._TRAJECTORY_FLUSH_INTERVAL
+            buffers.append(line)
+            buffer_size += len(line)
+            if buffer_size >= BaseAgent._TRAJECTORY_FLUSH_BYTES:
+                flush()
+
+        try:
+            while True:
+                timeout = max(deadline - time.monotonic(), 0.0) if buffers else None
+                wake.wait(timeout)
+                # 先清除再取数据：取数据期间的新提交会重新设置 Event
+                wake.clear()
+
+                while pending:
+                    item = pending.popleft()
+                    if item is None:
+                        closed.set()
+                        # 写完设置 closed 之前提交的条目（包括等待中的 flush 标记）
+                        while pending:
+                            item = pending.popleft()
+                            if item is not None:
+                                handle(item)
+                        flush()
+                        return
+                    handle(item)
+
+                if buffers and time.monotonic() >= deadline:
+                    flush()
+        finally:
+            closed.set()
+            if fd is not None:
+                os.close(fd)
+
+    @classmethod
+    def flush_trajectory_file(cls) -> None:
+        """等待所有已提交的轨迹条目写入文件"""
+        writer = BaseAgent._trajectory_writer
+        channel = BaseAgent._trajectory_channel
+        if writer is None or channel is None or not writer.is_alive():
+            return
+
+        # 提交一个 flush 标记，写入线程处理到它时说明之前的条目都已写入
+        pending, wake, _ = channel
+        done = threading.Event()
+        pending.append(done)
+        wake.set()
+        while not done.wait(0.1):
+            if not writer.is_alive():
+                return
+
+    @classmethod
+    def shutdown_trajectory_writer(cls) -> None:
+        """写完剩余的轨迹条目并停止后台写入线程"""
+        with BaseAgent._trajectory_file_lock:
+            writer = BaseAgent._trajectory_writer
+            channel = BaseAgent._trajectory_channel
+            if writer is None or channel is None:
+                return
+            if writer.is_alive():
+                pending, wake, _ = channel
+                pending.append(None)
+                wake.set()
+                writer.join()
+            BaseAgent._trajectory_writer = None
+            BaseAgent._trajectory_channel = None
+
+    @classmethod
+    def load_trajectory_file(cls, trajectory_file_path: str | Path | None = None) -> list[dict[str, Any]]:
+        """读取 JSONL 格式的轨迹文件
+
+        逐行解析，跳过损坏的行（例如进程中断时写了一半的最后一行）。
+
+        Args:
+            trajectory_file_path: 轨迹文件路径，默认使用当前设置的轨迹文件路径
+
+        Returns:
+            轨迹条目列表，文件不存在时返回空列表
+        """
+        cls.flush_trajectory_file()
+
+        path = Path(trajectory_file_path) if trajectory_file_path else cls._trajectory_file_path
+        if path is None or not path.exists():
+            return []
+
+        entries = []
+        with open(path, 'rb') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(_loads_json(line))
+                except json.JSONDecodeError:
+                    continue
+        return entries
+
     @classmethod
     def set_exp_info(cls, exp_name: str, exp_index: int) -> None:
         """设置当前exp信息（类级别，所有agent实例共享）
@@ -608,23 +1019,77 @@ class BaseAgent(ABC):
         """
         self._agent_name = name
     
+    def _dump_model(self, model: BaseModel) -> dict[str, Any]:
+        """获取模型的 model_dump 结果，按对象缓存
+
+        轨迹记录每个 step 都会序列化完整的 prompt，而其中绝大部分消息在之前的
+        step 中已经序列化过。缓存以对象 id 为键，并通过弱引用在对象回收时清除，
+        避免 id 复用导致命中错误的条目。
+
+        Args:
+            model: pydantic 模型（消息、工具规格等）
+
+        Returns:
+            model_dump() 的结果（调用方不应修改）
+        """
+        key = id(model)
+        cached = self._dump_cache.get(key)
+        if cached is not None and cached[0]() is model:
+            return cached[1]
+
+        cache = self._dump_cache
+
+        def _evict(ref: weakref.ref, key: int = key) -> None:
+            entry = cache.get(key)
+            if entry is not None and entry[0] is ref:
+                del cache[key]
+
+        dumped = model.model_dump()
+        cache[key] = (weakref.ref(model, _evict), dumped)
+        return dumped
+
+    def _dump_dialog(self, dialog: Dialog) -> dict[str, Any]:
+        """序列化对话，复用已缓存的消息和工具规格
+
+        对话在 step 之间只会在末尾追加消息，因此记录上次序列化到的位置，只序列化
+        新增的消息。对话被替换（重置、截断）或末尾消息发生变化时，从头重新构建
+        （单条消息仍命中 _dump_model 缓存）。返回的是缓存列表的浅拷贝，后续增量
+        追加不会改动已返回的结果。
+        """
+        messages = dialog.messages
+        state = self._dialog_dump_state
+        if (
+            state is not None
+            and state[0]() is dialog
+            and 0 < state[1] <= len(messages)
+            and messages[state[1] - 1] is state[2]
+        ):
+            dumped_messages, upto = state[3], state[1]
+        else:
+            dumped_messages, upto = [], 0
+
+        dumped_messages.extend(self._dump_model(msg) for msg in messages[upto:])
+        if messages:
+            self._dialog_dump_state = (weakref.ref(dialog), len(messages), messages[-1], dumped_messages)
+
+        return {
+            "messages": list(dumped_messages),
+            "tools": [self._dump_model(tool) for tool in dialog.tools],
+            "meta": dialog.meta,
+        }
+
     def _append_trajectory_entry(self, dialog_for_query: Dialog, step_record: "StepRecord") -> None:
         """追加轨迹条目到轨迹文件
 
         每次step完成后，将prompt、response和tool_responses追加保存到轨迹文件。
-        使用文件锁确保多个agent写入同一文件时的线程安全。
-
-        保存格式与现有轨迹格式保持一致：
-        [
-            {
-                "task_id": "...",
-                "status": "...",
-                "steps": ...,
-                "trajectory": {...}
-            }
-        ]
+        条目在当前线程序列化后提交给后台写入线程，由其统一写入文件，
+        多个agent写入同一文件时无需在step中等待文件锁。
 
-        每次step会追加一个新的条目，包含本次调用的prompt、response和tool_responses。
+        轨迹文件为 JSONL 格式，每行一个条目：
+        {"task_id": "...", "status": "...", "steps": ..., "trajectory": {...}}
+
+        每次step只追加一行，不再读取和重写整个文件，写入开销与文件大小无关。
+        读取时使用 load_trajectory_file()。
 
         Args:
             dialog_for_query: 发送给LLM的对话（prompt）
@@ -634,109 +1099,57 @@ class BaseAgent(ABC):
             return
 
         try:
-            with self._trajectory_file_lock:
-                # 读取现有数据
-                existing_data = []
-                if self._trajectory_file_path.exists():
-                    try:
-                        with open(self._trajectory_file_path, 'r', encoding='utf-8') as f:
-                            existing_data = json.load(f)
-                    except (json.JSONDecodeError, FileNotFoundError):
-                        # 如果文件损坏或不存在，从空列表开始
-                        existing_data = []
-
-                # 构建新的轨迹条目
-                # 格式与现有轨迹格式保持一致，但保存的是每次LLM调用的信息
-                task_id = self.trajectory.task_id if self.trajectory else "unknown"
-                status = self.trajectory.status if self.trajectory else "running"
-
-                # 将dialog_for_query转换为字典格式
-                prompt_dict = dialog_for_query.model_dump() if hasattr(dialog_for_query, 'model_dump') else {
-                    "messages": [
+            # 构建新的轨迹条目
+            # 格式与现有轨迹格式保持一致，但保存的是每次LLM调用的信息
+            task_id = self.trajectory.task_id if self.trajectory else "unknown"
+            status = self.trajectory.status if self.trajectory else "running"
+
+            # 将prompt、response和tool_responses转换为字典格式（复用已缓存的序列化结果）
+            prompt_dict = self._dump_dialog(dialog_for_query)
+            response_dict = self._dump_model(step_record.assistant_message)
+            tool_responses_list = [self._dump_model(tr) for tr in step_record.tool_responses]
+
+            # 构建轨迹条目，格式与现有轨迹格式保持一致
+            entry = {
+                "task_id": f"{task_id}_{self._agent_name or 'agent'}_step_{self._step_count}",
+                "exp_name": self._current_exp_name,      # exp阶段名称
+                "exp_index": self._current_exp_index,    # exp迭代序号
+                "status": status,
+                "steps": self._step_count,
+                "trajectory": {
+                    "task_id": task_id,
+                    "agent_name": self._agent_name or "unknown",
+                    "step": self._step_count,
+                    "dialogs": [prompt_dict],  # 保存本次调用的prompt
+                    "steps": [
                         {
-                            "role": msg.role.value if hasattr(msg.role, 'value') else str(msg.role),
-                            "content": msg.content if hasattr(msg, 'content') else str(msg)
+                            "step_id": self._step_count,
+                            "assistant_message": response_dict,  # 保存本次调用的response
+                            "tool_responses": tool_responses_list,  # 保存工具响应
+                            "meta": {}
                         }
-                        for msg in dialog_for_query.messages
                     ],
-                    "tools": dialog_for_query.tools if hasattr(dialog_for_query, 'tools') else []
-                }
-
-                # 从step_record中获取assistant_message
-                assistant_message = step_record.assistant_message
-
-                # 将assistant_message转换为字典格式
-                response_dict = assistant_message.model_dump() if hasattr(assistant_message, 'model_dump') else {
-                    "role": assistant_message.role.value if hasattr(assistant_message.role, 'value') else str(assistant_message.role),
-                    "content": assistant_message.content if hasattr(assistant_message, 'content') else "",
-                    "tool_calls": [
-                        {
-                            "id": tc.id if hasattr(tc, 'id') else "",
-                            "function": {
-                                "name": tc.function.name if hasattr(tc.function, 'name') else "",
-                                "arguments": tc.function.arguments if hasattr(tc.function, 'arguments') else ""
-                            }
-                        }
-                        for tc in (assistant_message.tool_calls or [])
-                    ] if hasattr(assistant_message, 'tool_calls') and assistant_message.tool_calls else []
-                }
-
-                # 将tool_responses转换为字典格式
-                tool_responses_list = []
-                for tr in step_record.tool_responses:
-                    tr_dict = tr.model_dump() if hasattr(tr, 'model_dump') else {
-                        "role": "tool",
-                        "content": tr.content if hasattr(tr, 'content') else "",
-                        "tool_call_id": tr.tool_call_id if hasattr(tr, 'tool_call_id') else "",
-                        "name": tr.name if hasattr(tr, 'name') else ""
-                    }
-                    tool_responses_list.append(tr_dict)
-
-                # 构建轨迹条目，格式与现有轨迹格式保持一致
-                entry = {
-                    "task_id": f"{task_id}_{self._agent_name or 'agent'}_step_{self._step_count}",
-                    "exp_name": self._current_exp_name,      # exp阶段名称
-                    "exp_index": self._current_exp_index,    # exp迭代序号
+                    "start_time": None,
+                    "end_time": None,
                     "status": status,
-                    "steps": self._step_count,
-                    "trajectory": {
-                        "task_id": task_id,
+                    "result": {
+                        "prompt": prompt_dict,
+                        "response": response_dict
+                    },
+                    "meta": {
+                        "agent_version": self.VERSION,
                         "agent_name": self._agent_name or "unknown",
-                        "step": self._step_count,
-                        "dialogs": [prompt_dict],  # 保存本次调用的prompt
-                        "steps": [
-                            {
-                                "step_id": self._step_count,
-                                "assistant_message": response_dict,  # 保存本次调用的response
-                                "tool_responses": tool_responses_list,  # 保存工具响应
-                                "meta": {}
-                            }
-                        ],
-                        "start_time": None,
-                        "end_time": None,
-                        "status": status,
-                        "result": {
-                            "prompt": prompt_dict,
-                            "response": response_dict
-                        },
-                        "meta": {
-                            "agent_version": self.VERSION,
-                            "agent_name": self._agent_name or "unknown",
-                            "step": self._step_count
-                        }
+                        "step": self._step_count
                     }
                 }
+            }
 
-                # 追加新条目
-                existing_data.append(entry)
-
-                # 写回文件
-                with open(self._trajectory_file_path, 'w', encoding='utf-8') as f:
-                    json.dump(existing_data, f, indent=2, default=str, ensure_ascii=False)
+            # 以 JSONL 格式序列化，交给后台线程追加到文件
+            self._submit_trajectory_line(self._trajectory_file_path, _dumps_jsonl(entry))
 
         except Exception as e:
             # 如果保存失败，只记录日志，不中断执行
-            self.logger.warning(f"Failed to append trajectory entry: {e}", exc_info=True)
+            self.logger.warning("Failed to append trajectory entry: %s", e, exc_info=True)
 
     @abstractmethod
     def _get_system_prompt(self) -> str:
@@ -800,6 +1213,9 @@ class Agent(BaseAgent):
         self._system_prompt: str | None = None
         self._user_prompt: str | None = None
         self._prompt_format_kwargs = prompt_format_kwargs or {}
+
+        # 系统提示词缓存：(缓存键, 提示词)，键变化时重新组装
+        self._system_prompt_cache: tuple[tuple, str] | None = None
         
         # 加载系统提示词（优先级：system_prompt_file > 默认）
         if system_prompt_file:
@@ -852,8 +1268,24 @@ Always be careful with file operations and bash commands.
         return prompt
 
     def _get_system_prompt(self) -> str:
-        """获取系统提示词，动态添加工作目录信息；若有 skill_registry 则自动注入 skills 信息"""
+        """获取系统提示词，动态添加工作目录信息；若有 skill_registry 则自动注入 skills 信息
+
+        组装结果按 (基础提示词, 工作目录, 当前目录, skill_registry 及其版本) 缓存，
+        这些输入都不变时直接返回上次的结果，不再重新生成 skills 信息。
+        """
         working_dir = self.session.config.workspace_path
+        skill_registry = self.skill_registry
+        cache_key = (
+            self._system_prompt,
+            working_dir,
+            os.getcwd(),
+            skill_registry,
+            skill_registry.version if skill_registry is not None else None,
+        )
+        cached = self._system_prompt_cache
+        if cached is not None and cached[0] == cache_key:
+            return cached[1]
+
         # 将相对路径转换为绝对路径
         working_dir_abs = str(Path(working_dir).absolute())
         working_dir_info = f"\n\n重要提示：当前工作目录是 {working_dir_abs}。你必须在这个目录下进行所有操作，不能切换工作目录。所有文件操作、命令执行都必须在工作目录 {working_dir_abs} 下进行。"
@@ -869,6 +1301,7 @@ You can use the 'use_skill' tool to:
 2. Get reference documentation: action='get_reference'
 3. Run scripts from Operator skills: action='run_script'
 """
+        self._system_prompt_cache = (cache_key, prompt)
         return prompt
 
     def _get_user_prompt(self, task: TaskInstance) -> str:
@@ -876,13 +1309,13 @@ You can use the 'use_skill' tool to:
         # 如果设置了用户提示词，使用它（可以包含{}占位符）
         if self._user_prompt:
             try:
-                return self._user_prompt.format(
+                return _format_template(self._user_prompt, dict(
                     task_id=task.task_id,
                     task_type=task.task_type,
                     description=task.description,
                     input_data=task.input_data,
                     **self._prompt_format_kwargs
-                )
+                ))
             except KeyError:
                 # 如果格式化失败，直接返回（可能没有占位符）
                 return self._user_prompt
@@ -5,16 +5,25 @@
 
 from __future__ import annotations
 
+import re
+import weakref
 from abc import ABC, abstractmethod
+from bisect import bisect_left
+from itertools import islice
 from enum import Enum
-from typing import TYPE_CHECKING, Any, Literal
+from typing import TYPE_CHECKING, Any, Callable, Literal
 
 from pydantic import BaseModel, Field
 
 if TYPE_CHECKING:
-    from evomaster.utils.types import Dialog, Message
+    from evomaster.utils.types import Dialog, Message, MessageRole
 else:
-    from evomaster.utils.types import Dialog, Message
+    from evomaster.utils.types import Dialog, Message, MessageRole
+
+# 消息角色常量（按身份比较，避免每条消息都访问 .value 再做字符串比较）
+_ASSISTANT = MessageRole.ASSISTANT
+_SYSTEM = MessageRole.SYSTEM
+_TOOL = MessageRole.TOOL
 
 
 class TruncationStrategy(str, Enum):
@@ -23,11 +32,96 @@ class TruncationStrategy(str, Enum):
     LATEST_HALF = "latest_half"  # 保留最新一半
     SLIDING_WINDOW = "sliding_window"  # 滑动窗口
     SUMMARY = "summary"  # 摘要压缩
+    COMPACTION = "compaction"  # 删除工具输出中的低信息量行（不改写保留的行）
+
+
+# 工具输出中的低信息量行：纯时间戳、git / pip / apt 进度输出、进度条
+_NOISE_LINE_PATTERN = re.compile(
+    r"^\s*\[?\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}[\d.,:+\-Z]*\]?\s*$"
+    r"|^\s*(?:Cloning into|Fetching|Receiving objects|Resolving deltas|Unpacking objects|Updating files)\b"
+    r"|^\s*remote: (?:Enumerating|Counting|Compressing|Total)\b"
+    r"|^\s*(?:Downloading|Collecting|Requirement already satisfied|Using cached)\b"
+    r"|^\s*(?:Get|Hit|Ign):\d+ "
+    r"|\d+%\|.*\|"
+)
+# 即使匹配低信息量规则也要保留的行：错误信息、调用栈、行号引用
+_SALIENT_LINE_PATTERN = re.compile(
+    r"error|exception|traceback|fail|warning|\bline \d+|File \"",
+    re.IGNORECASE,
+)
+
+
+def _compact_text(text: str) -> str:
+    """逐行删除低信息量内容，保留的行原样不变（包括行尾的换行符）
+
+    删除匹配 _NOISE_LINE_PATTERN 的行（包含错误等关键信息的行除外）、与上一条
+    保留行完全相同的重复行，并把连续空行合并为一行。
+    """
+    kept: list[str] = []
+    previous: str | None = None
+    for line in text.splitlines(keepends=True):
+        body = line.rstrip("\r\n")
+        if not body.strip():
+            if previous == "":
+                continue
+            kept.append(line)
+            previous = ""
+            continue
+        if body == previous:
+            continue
+        if _NOISE_LINE_PATTERN.search(body) and not _SALIENT_LINE_PATTERN.search(body):
+            continue
+        kept.append(line)
+        previous = body
+    return "".join(kept)
+
+
+def _cached_per_message(
+    cache: dict[int, tuple[weakref.ref, Any]],
+    message: Message,
+    compute: Callable[[Message], Any],
+) -> Any:
+    """按消息对象缓存计算结果
+
+    对话中的历史消息追加后不再修改，每条消息只需计算一次。缓存以对象 id 为键，
+    并通过弱引用在消息回收时清除，避免 id 复用导致命中错误的条目。
+    """
+    key = id(message)
+    cached = cache.get(key)
+    if cached is not None and cached[0]() is message:
+        return cached[1]
+
+    def _evict(ref: weakref.ref, key: int = key) -> None:
+        entry = cache.get(key)
+        if entry is not None and entry[0] is ref:
+            del cache[key]
+
+    value = compute(message)
+    cache[key] = (weakref.ref(message, _evict), value)
+    return value
+
+
+def _compact_message(message: Message) -> Message | None:
+    """精简工具消息的内容，返回精简后的副本；无需精简时返回 None"""
+    content = _compact_text(message.content)
+    if content == message.content:
+        return None
+    return message.model_copy(update={"content": content})
+
+
+def _no_truncation(dialog: Dialog) -> Dialog:
+    """不截断，直接返回原对话"""
+    return dialog
+
+
+def _content_chars(message: Message) -> int:
+    """消息内容的字符数"""
+    return len(message.content or "")
 
 
 class ContextConfig(BaseModel):
     """上下文管理配置"""
-    max_tokens: int = Field(default=128000, description="最大 token 数")
+    max_tokens: int = Field(default=128000, description="最大 token 数，<= 0 表示不限制")
     truncation_strategy: TruncationStrategy = Field(
         default=TruncationStrategy.LATEST_HALF,
         description="截断策略"
@@ -40,6 +134,14 @@ class ContextConfig(BaseModel):
         default=5,
         description="保留最近的对话轮数"
     )
+    messages_per_turn: int = Field(
+        default=3,
+        description="滑动窗口截断时每轮对话估算的消息数"
+    )
+    cached_token_discount: float = Field(
+        default=0.0,
+        description="判断是否截断时，与上次查询相同的前缀（可被提供方 prompt 缓存）的 token 折扣比例，0 表示不折扣"
+    )
 
 
 class ContextManager:
@@ -54,28 +156,142 @@ class ContextManager:
     def __init__(self, config: ContextConfig | None = None):
         self.config = config or ContextConfig()
         self._token_counter: TokenCounter | None = None
+        # 单条消息计数缓存：id(消息) -> (弱引用, 计数)
+        # 未设置 token 计数器时缓存字符数，否则缓存 token 数
+        self._msg_token_cache: dict[int, tuple[weakref.ref, int]] = {}
+        # 工具消息对象 -> 精简后的副本（无需精简时为 None），与 _msg_token_cache 相同的弱引用缓存
+        self._compaction_cache: dict[int, tuple[weakref.ref, Message | None]] = {}
+        # 增量计数状态：(对话弱引用, 已计数消息数, 最后一条已计数消息, 累计计数)
+        self._running_state: tuple[weakref.ref, int, Message, int] | None = None
+        # 上次查询发送的消息（用于计算可被提供方 prompt 缓存的前缀）
+        self._last_query_messages: list[Message] = []
+        # 上次查询发送的对话的 token 数（未截断时记录，截断后为 None）
+        self._last_query_tokens: int | None = None
+        # 截断策略 -> 截断函数
+        self._strategy_dispatch: dict[TruncationStrategy | str, Callable[[Dialog], Dialog]] = {
+            TruncationStrategy.NONE: _no_truncation,
+            TruncationStrategy.LATEST_HALF: self._truncate_latest_half,
+            TruncationStrategy.SLIDING_WINDOW: self._truncate_sliding_window,
+            TruncationStrategy.SUMMARY: self._truncate_with_summary,
+            TruncationStrategy.COMPACTION: self._truncate_compaction,
+        }
+        # 消息位置索引：(对话弱引用, 已扫描消息数, 最后一条已扫描消息, assistant 消息下标列表, system 消息下标列表)
+        self._role_index_state: tuple[weakref.ref, int, Message, list[int], list[int]] | None = None
 
     def set_token_counter(self, counter: TokenCounter) -> None:
         """设置 token 计数器"""
         self._token_counter = counter
+        self._msg_token_cache.clear()
+        self._running_state = None
+        self._last_query_tokens = None
+
+    def _count_message_cached(self, message: Message, count: Callable[[Message], int]) -> int:
+        """计算单条消息的计数，按对象缓存（见 _cached_per_message）"""
+        return _cached_per_message(self._msg_token_cache, message, count)
+
+    def _running_total(
+        self,
+        dialog: Dialog,
+        count: Callable[[Message], int],
+        count_all: Callable[[Dialog], int] | None = None,
+    ) -> int:
+        """增量累计对话中所有消息的计数
+
+        对话在两次查询之间只会在末尾追加消息，因此记录上次累计到的位置和结果，
+        只对新增的消息计数。对话被替换或已计数部分发生变化时从头累计
+        （单条消息仍命中 _count_message_cached 缓存）；提供了 count_all 时，
+        从头累计改为直接用它对整段对话计数。
+        """
+        messages = dialog.messages
+        num_messages = len(messages)
+        state = self._running_state
+        if (
+            state is not None
+            and state[0]() is dialog
+            and 0 < state[1] <= num_messages
+            and messages[state[1] - 1] is state[2]
+        ):
+            start, total = state[1], state[3]
+        elif count_all is not None:
+            start, total = num_messages, count_all(dialog)
+        else:
+            start, total = 0, 0
+
+        for i in range(start, num_messages):
+            total += self._count_message_cached(messages[i], count)
+
+        if num_messages:
+            self._running_state = (weakref.ref(dialog), num_messages, messages[-1], total)
+        return total
 
     def estimate_tokens(self, dialog: Dialog) -> int:
         """估算对话的 token 数
         
         如果设置了 token 计数器，使用计数器；否则使用简单估算。
+        计数按消息缓存并增量累计，每轮只对新追加的消息计数。
         """
-        if self._token_counter:
-            return self._token_counter.count_dialog(dialog)
-        
-        # 简单估算：每 4 个字符约 1 个 token
-        total_chars = sum(
-            len(msg.content or "") for msg in dialog.messages
-        )
-        return total_chars // 4
+        counter = self._token_counter
+        if counter is None:
+            # 简单估算：每 4 个字符约 1 个 token
+            return self._running_total(dialog, _content_chars) // 4
+
+        count_dialog = type(counter).count_dialog
+        if count_dialog not in _SUMMING_COUNT_DIALOG:
+            # 计数器自定义了整段对话的计数方式，无法按消息缓存
+            return counter.count_dialog(dialog)
+        if count_dialog is SimpleTokenCounter.count_dialog and counter._uses_char_estimate():
+            # 基于字符数的整段求和比逐条查缓存更快（结果与逐条求和相同）：增量状态
+            # 未命中时（如每轮新建的截断后对话）用它整段计数
+            return self._running_total(dialog, counter.count_message, counter.count_dialog)
+        return self._running_total(dialog, counter.count_message)
+
+    def _cached_prefix_length(self, dialog: Dialog) -> int:
+        """与上次查询相同（同一消息对象）的前缀消息数
+
+        逐条比较对象身份：截断策略可能替换中间的消息（如 COMPACTION 生成的精简副本），
+        只比较首尾两条会把被替换的消息误计入前缀。
+        """
+        last = self._last_query_messages
+        for i, (message, last_message) in enumerate(zip(dialog.messages, last)):
+            if message is not last_message:
+                return i
+        return min(len(last), len(dialog.messages))
+
+    def estimate_cached_tokens(self, dialog: Dialog) -> int:
+        """估算对话中可被提供方 prompt 缓存的 token 数
+
+        即与上次 prepare_for_query 发送的对话相同的前缀消息的 token 数。
+        """
+        prefix = self._cached_prefix_length(dialog)
+        if not prefix:
+            return 0
+        if prefix == len(self._last_query_messages) and self._last_query_tokens is not None:
+            # 上次发送的对话整体是当前对话的前缀
+            return self._last_query_tokens
+        counter = self._token_counter
+        if counter is not None and type(counter).count_dialog not in _SUMMING_COUNT_DIALOG:
+            # 计数器自定义了整段对话的计数方式：只对前缀部分计数
+            return counter.count_dialog(dialog.with_messages(dialog.messages[:prefix]))
+        prefix_messages = islice(dialog.messages, prefix)
+        if counter is None:
+            return sum(self._count_message_cached(msg, _content_chars) for msg in prefix_messages) // 4
+        count_message = counter.count_message
+        return sum(self._count_message_cached(msg, count_message) for msg in prefix_messages)
 
     def should_truncate(self, dialog: Dialog) -> bool:
-        """判断是否需要截断"""
-        return self.estimate_tokens(dialog) > self.config.max_tokens
+        """判断是否需要截断
+
+        max_tokens <= 0 表示不限制，直接返回 False，不估算 token。
+        配置了 cached_token_discount 时，可被提供方缓存的前缀按折扣计入。
+        """
+        max_tokens = self.config.max_tokens
+        if max_tokens <= 0:
+            return False
+        tokens = self.estimate_tokens(dialog)
+        discount = self.config.cached_token_discount
+        if tokens > max_tokens and discount > 0:
+            tokens -= int(self.estimate_cached_tokens(dialog) * discount)
+        return tokens > max_tokens
 
     def truncate(self, dialog: Dialog) -> Dialog:
         """根据策略截断对话历史
@@ -83,53 +299,96 @@ class ContextManager:
         Returns:
             截断后的新 Dialog 对象
         """
-        if self.config.truncation_strategy == TruncationStrategy.NONE:
-            return dialog
-        elif self.config.truncation_strategy == TruncationStrategy.LATEST_HALF:
-            return self._truncate_latest_half(dialog)
-        elif self.config.truncation_strategy == TruncationStrategy.SLIDING_WINDOW:
-            return self._truncate_sliding_window(dialog)
-        elif self.config.truncation_strategy == TruncationStrategy.SUMMARY:
-            return self._truncate_with_summary(dialog)
-        else:
-            return dialog
+        truncate_func = self._strategy_dispatch.get(self.config.truncation_strategy, _no_truncation)
+        return truncate_func(dialog)
 
-    def _truncate_latest_half(self, dialog: Dialog) -> Dialog:
-        """保留最新一半的历史
-        
-        保留系统消息和用户初始消息，然后保留最近一半的对话。
+    def register_strategy(
+        self,
+        strategy: TruncationStrategy | str,
+        func: Callable[[Dialog], Dialog],
+    ) -> None:
+        """注册或替换截断策略
+
+        Args:
+            strategy: 策略名称（config.truncation_strategy 的取值）
+            func: 截断函数，接收 Dialog 并返回截断后的 Dialog（不应修改传入的对话）
+        """
+        self._strategy_dispatch[strategy] = func
+
+    def _role_indices(self, dialog: Dialog) -> tuple[list[int], list[int]]:
+        """获取对话中 assistant 消息和 system 消息的下标（升序）
+
+        与 _running_total 一样增量维护：同一对话只在末尾追加消息时，只扫描新增部分。
+
+        Returns:
+            (assistant 消息下标列表, system 消息下标列表)（调用方不应修改）
         """
         messages = dialog.messages
+        num_messages = len(messages)
+        state = self._role_index_state
+        if (
+            state is not None
+            and state[0]() is dialog
+            and 0 < state[1] <= num_messages
+            and messages[state[1] - 1] is state[2]
+        ):
+            start, assistant_indices, system_indices = state[1], state[3], state[4]
+        else:
+            start, assistant_indices, system_indices = 0, [], []
+
+        for i in range(start, num_messages):
+            role = messages[i].role
+            if role is _ASSISTANT:
+                assistant_indices.append(i)
+            elif role is _SYSTEM:
+                system_indices.append(i)
+
+        if num_messages:
+            self._role_index_state = (
+                weakref.ref(dialog), num_messages, messages[-1], assistant_indices, system_indices
+            )
+        return assistant_indices, system_indices
+
+    def _latest_half_bounds(self, dialog: Dialog) -> tuple[int, int] | None:
+        """计算 latest_half 截断的位置
+
+        Returns:
+            (assistant_start, preserve_start)：保留 messages[:assistant_start] 和
+            messages[preserve_start:]；无法截断时返回 None
+        """
+        assistant_indices, _ = self._role_indices(dialog)
         
-        # 找到第一个 assistant 消息的位置
-        assistant_start = 0
-        for i, msg in enumerate(messages):
-            if msg.role.value == "assistant":
-                assistant_start = i
-                break
+        # 第一个 assistant 消息的位置
+        assistant_start = assistant_indices[0] if assistant_indices else 0
         
         # 计算需要保留的消息数量
-        num_messages = len(messages)
+        num_messages = len(dialog.messages)
         num_to_truncate = num_messages - assistant_start
         num_to_preserve = num_to_truncate // 2
         preserve_start = num_messages - num_to_preserve
         
-        # 确保从 assistant 消息开始
-        while preserve_start < num_messages and messages[preserve_start].role.value != "assistant":
-            preserve_start += 1
+        # 确保从 assistant 消息开始（preserve_start 及之后的第一个 assistant 消息）
+        pos = bisect_left(assistant_indices, preserve_start)
+        if pos == len(assistant_indices):
+            return None
+        return assistant_start, assistant_indices[pos]
+
+    def _truncate_latest_half(self, dialog: Dialog) -> Dialog:
+        """保留最新一半的历史
         
-        if preserve_start >= num_messages:
+        保留系统消息和用户初始消息，然后保留最近一半的对话。
+        """
+        messages = dialog.messages
+        bounds = self._latest_half_bounds(dialog)
+        if bounds is None:
             # 无法截断，返回原对话
             return dialog
+        assistant_start, preserve_start = bounds
         
         # 构建新对话
         new_messages = messages[:assistant_start] + messages[preserve_start:]
         
-        return Dialog(
-            messages=new_messages,
-            tools=dialog.tools,
-            meta={**dialog.meta, "truncated": True, "strategy": "latest_half"}
-        )
+        return dialog.with_messages(new_messages, truncated=True, strategy="latest_half")
 
     def _truncate_sliding_window(self, dialog: Dialog) -> Dialog:
         """滑动窗口截断
@@ -138,29 +397,71 @@ class ContextManager:
         """
         messages = dialog.messages
         preserve_turns = self.config.preserve_recent_turns
+        _, system_indices = self._role_indices(dialog)
+        num_system = len(system_indices)
         
-        # 分离系统消息和其他消息
-        system_messages: list[Message] = []
-        other_messages: list[Message] = []
-        
-        for msg in messages:
-            if msg.role.value == "system":
-                system_messages.append(msg)
-            else:
-                other_messages.append(msg)
-        
-        # 计算需要保留的消息数（每轮约 2-3 条消息）
-        keep_count = preserve_turns * 3
-        if len(other_messages) <= keep_count:
+        # 计算需要保留的消息数
+        keep_count = preserve_turns * self.config.messages_per_turn
+        if len(messages) - num_system <= keep_count:
             return dialog
         
+        # 分离系统消息和其他消息
+        if num_system == 0 or system_indices[-1] == num_system - 1:
+            # 系统消息都在开头（通常情况），直接切片
+            system_messages = messages[:num_system]
+            other_messages = messages[num_system:]
+        else:
+            system_messages = [messages[i] for i in system_indices]
+            other_messages = [msg for msg in messages if msg.role is not _SYSTEM]
+        
         # 保留最近的消息
         new_messages = system_messages + other_messages[-keep_count:]
         
-        return Dialog(
-            messages=new_messages,
-            tools=dialog.tools,
-            meta={**dialog.meta, "truncated": True, "strategy": "sliding_window"}
+        return dialog.with_messages(new_messages, truncated=True, strategy="sliding_window")
+
+    def _truncate_compaction(self, dialog: Dialog) -> Dialog:
+        """逐行精简历史工具输出
+
+        对最近 N 轮之前的工具消息删除低信息量的行（进度输出、重复行等），保留的行
+        原样不变，不需要调用 LLM。精简后仍超过 max_tokens 时，再按 latest_half 截断。
+        每条消息的精简结果按原消息缓存，之后每轮复用同一个副本，不再重复精简，
+        副本也能命中 token 计数等按对象的缓存。
+        """
+        messages = dialog.messages
+        keep_count = self.config.preserve_recent_turns * self.config.messages_per_turn
+        compact_end = max(len(messages) - keep_count, 0)
+
+        new_messages = list(messages)
+        changed = False
+        for i in range(compact_end):
+            msg = messages[i]
+            if msg.role is not _TOOL or not msg.content:
+                continue
+            compacted_msg = _cached_per_message(self._compaction_cache, msg, _compact_message)
+            if compacted_msg is not None:
+                new_messages[i] = compacted_msg
+                changed = True
+
+        if not changed:
+            return self._truncate_latest_half(dialog)
+
+        compacted = dialog.with_messages(new_messages, truncated=True, strategy="compaction")
+        # 估算精简后的对话时保留原对话的增量计数状态，下一轮仍可增量累计
+        running_state = self._running_state
+        still_too_long = self.estimate_tokens(compacted) > self.config.max_tokens
+        self._running_state = running_state
+        if not still_too_long:
+            return compacted
+
+        # 精简不改变消息位置和角色，直接使用原对话的 latest_half 截断位置
+        bounds = self._latest_half_bounds(dialog)
+        if bounds is None:
+            return compacted
+        assistant_start, preserve_start = bounds
+        return dialog.with_messages(
+            new_messages[:assistant_start] + new_messages[preserve_start:],
+            truncated=True,
+            strategy="compaction+latest_half",
         )
 
     def _truncate_with_summary(self, dialog: Dialog) -> Dialog:
@@ -175,11 +476,27 @@ class ContextManager:
     def prepare_for_query(self, dialog: Dialog) -> Dialog:
         """为 LLM 查询准备对话
         
-        检查并在必要时截断对话。
+        检查并在必要时截断对话。NONE 策略不会截断，因此直接返回，不估算 token。
+        配置了 cached_token_discount 时，记录本次发送的消息供下一轮计算缓存前缀，
+        并返回 meta 中带有 cached_tokens（与上次查询相同的前缀的 token 数）的对话副本，
+        传入的对话不会被修改；未配置时不做这些额外的计数。
         """
-        if self.should_truncate(dialog):
-            return self.truncate(dialog)
-        return dialog
+        if self.config.truncation_strategy == TruncationStrategy.NONE:
+            return dialog
+        prepared = self.truncate(dialog) if self.should_truncate(dialog) else dialog
+        if self.config.cached_token_discount <= 0 or self.config.max_tokens <= 0:
+            return prepared
+
+        cached_tokens = self.estimate_cached_tokens(prepared)
+        self._last_query_messages = list(prepared.messages)
+        # 未截断且按消息增量累计时，token 数在 should_truncate 中已累计，直接复用；
+        # 其他情况不额外计数，下一轮按前缀计数
+        counter = self._token_counter
+        if prepared is dialog and (counter is None or type(counter).count_dialog in _SUMMING_COUNT_DIALOG):
+            self._last_query_tokens = self.estimate_tokens(dialog)
+        else:
+            self._last_query_tokens = None
+        return prepared.with_messages(prepared.messages, cached_tokens=cached_tokens)
 
 
 class TokenCounter(ABC):
@@ -218,3 +535,29 @@ class SimpleTokenCounter(TokenCounter):
         overhead = 4
         return content_tokens + overhead
 
+    @classmethod
+    def _uses_char_estimate(cls) -> bool:
+        """单条计数是否仍是基于字符数的默认实现（子类可能覆盖为真实 tokenizer）"""
+        return (
+            cls.count_text is SimpleTokenCounter.count_text
+            and cls.count_message is SimpleTokenCounter.count_message
+        )
+
+    def count_dialog(self, dialog: Dialog) -> int:
+        """计算对话的总 token 数
+
+        结果与逐条 count_message 求和相同，但在一个生成器表达式中完成，
+        省去每条消息两次方法调用。子类覆盖了 count_text 或 count_message 时
+        回退为逐条求和，与子类的单条计数保持一致。
+        """
+        if not self._uses_char_estimate():
+            return super().count_dialog(dialog)
+        chars_per_token = self.chars_per_token
+        messages = dialog.messages
+        return sum(int(len(msg.content or "") / chars_per_token) for msg in messages) + 4 * len(messages)
+
+
+# count_dialog 等于逐条 count_message 之和的实现，ContextManager 可以按消息缓存并增量累计
+# （SimpleTokenCounter 的子类覆盖单条计数时，count_dialog 回退为逐条求和，仍然成立）
+_SUMMING_COUNT_DIALOG = (TokenCounter.count_dialog, SimpleTokenCounter.count_dialog)
+
@@ -71,6 +71,24 @@ class BaseSession(ABC):
         """
         pass
 
+    def exec_bash_many(
+        self,
+        commands: list[str],
+        timeout: int | None = None,
+    ) -> list[dict[str, Any]]:
+        """依次执行多条互相独立的 Bash 命令
+        
+        默认实现逐条调用 exec_bash；子类可以覆盖为一次往返批量执行。
+        
+        Args:
+            commands: 要执行的命令列表
+            timeout: 超时时间（秒），None 使用默认值
+            
+        Returns:
+            与 commands 一一对应的执行结果字典列表（格式同 exec_bash）
+        """
+        return [self.exec_bash(command, timeout) for command in commands]
+
     @abstractmethod
     def upload(self, local_path: str, remote_path: str) -> None:
         """上传文件到远程环境
@@ -115,11 +133,22 @@ class BaseSession(ABC):
             content: 文件内容
             encoding: 文件编码
         """
+        self.write_bytes(remote_path, content.encode(encoding))
+
+    def write_bytes(self, remote_path: str, data: bytes) -> None:
+        """写入字节内容到远程文件
+        
+        默认实现先写入本地临时文件再 upload，子类可以覆盖为直接写入。
+        
+        Args:
+            remote_path: 远程文件路径
+            data: 文件内容（字节）
+        """
         import tempfile
         import os
         
         with tempfile.NamedTemporaryFile(mode="wb", delete=False) as f:
-            f.write(content.encode(encoding))
+            f.write(data)
             temp_path = f.name
         
         try:
@@ -127,6 +156,27 @@ class BaseSession(ABC):
         finally:
             os.unlink(temp_path)
 
+    def stat_path(self, remote_path: str) -> tuple[bool, bool, bool]:
+        """一次性检查远程路径是否存在、是否是文件、是否是目录
+        
+        三项检查合并为一次 exec_bash，需要判断路径类型时应优先使用此方法，
+        而不是依次调用 path_exists / is_file / is_directory。
+        
+        Args:
+            remote_path: 远程路径
+            
+        Returns:
+            (是否存在, 是否是文件, 是否是目录)
+        """
+        result = self.exec_bash(
+            f'test -e "{remote_path}" && echo "exists"; '
+            f'test -f "{remote_path}" && echo "file"; '
+            f'test -d "{remote_path}" && echo "dir"; true'
+        )
+        # 按行精确匹配，避免误判（如命令回显中包含的关键字）
+        lines = {line.strip() for line in result.get("stdout", "").splitlines()}
+        return "exists" in lines, "file" in lines, "dir" in lines
+
     def path_exists(self, remote_path: str) -> bool:
         """检查远程路径是否存在
         
@@ -136,10 +186,7 @@ class BaseSession(ABC):
         Returns:
             是否存在
         """
-        result = self.exec_bash(f'test -e "{remote_path}" && echo "exists" || echo "not_exists"')
-        stdout = result.get("stdout", "").strip()
-        # 精确匹配，避免误判（如 "exists" in "not_exists"）
-        return stdout == "exists"
+        return self.stat_path(remote_path)[0]
 
     def is_file(self, remote_path: str) -> bool:
         """检查远程路径是否是文件
@@ -150,10 +197,7 @@ class BaseSession(ABC):
         Returns:
             是否是文件
         """
-        result = self.exec_bash(f'test -f "{remote_path}" && echo "file" || echo "not_file"')
-        stdout = result.get("stdout", "").strip()
-        # 精确匹配，避免误判（如 "file" in "not_file"）
-        return stdout == "file"
+        return self.stat_path(remote_path)[1]
 
     def is_directory(self, remote_path: str) -> bool:
         """检查远程路径是否是目录
@@ -164,10 +208,7 @@ class BaseSession(ABC):
         Returns:
             是否是目录
         """
-        result = self.exec_bash(f'test -d "{remote_path}" && echo "dir" || echo "not_dir"')
-        stdout = result.get("stdout", "").strip()
-        # 精确匹配，避免误判（如 "dir" in "not_dir"）
-        return stdout == "dir"
+        return self.stat_path(remote_path)[2]
 
     def __enter__(self) -> BaseSession:
         """上下文管理器入口"""
@@ -5,15 +5,40 @@
 
 from __future__ import annotations
 
+import functools
+import re
+import shlex
 import time
 from typing import Any, Literal
 
 from pydantic import Field
 
-from evomaster.env.docker import DockerEnv, DockerEnvConfig, PS1_PATTERN, BashMetadata
+from evomaster.env.docker import DockerEnv, DockerEnvConfig, PS1_BEGIN, PS1_PATTERN, BashMetadata
 
 from .base import BaseSession, SessionConfig
 
+# exec_bash 轮询 tmux 日志的间隔：从最小值开始，每次未完成时按倍数增长，直到最大值
+_POLL_INTERVAL_MIN = 0.01
+_POLL_INTERVAL_MAX = 1.0
+_POLL_BACKOFF = 1.5
+
+# 输出开头的空白（用于去除命令回显）
+_LEADING_WHITESPACE = re.compile(r"\s*")
+
+# exec_bash_many 在每条命令之后输出的分隔标记：__EVO_BATCH_<序号>:<退出码>
+# 标记前后各补一个换行，命令输出不以换行结尾时标记仍独占一行；匹配时一并去掉这两个换行
+_BATCH_MARKER = "__EVO_BATCH_"
+_BATCH_MARKER_PATTERN = re.compile(rf"(?:\r?\n|^){_BATCH_MARKER}(\d+):(\d+)\r?(?:\n|$)")
+
+
+@functools.lru_cache(maxsize=256)
+def _parse_ps1(json_str: str) -> BashMetadata:
+    """解析 PS1 元数据，按 JSON 文本缓存（相同的提示符会反复出现）
+
+    返回的对象在调用之间共享，调用方只能读取，不应修改。
+    """
+    return BashMetadata.from_json(json_str)
+
 
 class DockerSessionConfig(SessionConfig):
     """Docker Session 配置"""
@@ -47,6 +72,10 @@ class DockerSession(BaseSession):
         self._last_ps1_count: int = 0
         self._prev_command_status: Literal["completed", "timeout"] = "completed"
         self._prev_command_output: str = ""
+        # PS1 增量扫描状态：tmux 日志只会在末尾追加，已扫描过的部分不再重复匹配
+        self._ps1_spans: list[tuple[int, int]] = []  # 已找到的 PS1 块 (start, end)
+        self._last_ps1_json: str = ""  # 最后一个 PS1 块中的元数据 JSON
+        self._log_scan_offset: int = 0  # 下次扫描的起始位置
         
     def open(self) -> None:
         """启动 Docker 容器"""
@@ -59,9 +88,9 @@ class DockerSession(BaseSession):
             self._env.setup()
         
         # 获取初始 PS1 计数
-        logs = self._env.get_tmux_logs()
-        matches = list(PS1_PATTERN.finditer(logs))
-        self._last_ps1_count = len(matches)
+        self._ps1_spans = []
+        self._log_scan_offset = 0
+        self._last_ps1_count = self._scan_ps1(self._env.get_tmux_logs())
         
         self._is_open = True
         self.logger.info("Docker session opened")
@@ -82,6 +111,39 @@ class DockerSession(BaseSession):
         self._is_open = False
         self.logger.info("Session closed")
 
+    def _scan_ps1(self, logs: str) -> int:
+        """增量扫描 tmux 日志中的 PS1 块
+
+        只从上次扫描停止的位置开始匹配，并记录每个 PS1 块的位置，避免每次轮询
+        都对完整日志重新执行正则匹配。下次扫描从最后一个可能未完整输出的 PS1
+        块开头（或日志末尾）继续。日志变短（被截断或重建）时从头扫描。
+
+        Args:
+            logs: 完整的 tmux 日志
+
+        Returns:
+            日志中 PS1 块的总数
+        """
+        if len(logs) < self._log_scan_offset:
+            self._ps1_spans = []
+            self._log_scan_offset = 0
+
+        spans = self._ps1_spans
+        scan_end = self._log_scan_offset
+        for match in PS1_PATTERN.finditer(logs, self._log_scan_offset):
+            spans.append(match.span())
+            self._last_ps1_json = match.group(1)
+            scan_end = match.end()
+
+        # 下次从尚未闭合的 PS1 开始标记处继续；没有时只需回退开始标记的长度，
+        # 以便匹配跨越两次读取的标记
+        begin_marker = PS1_BEGIN.strip()
+        pending = logs.find(begin_marker, scan_end)
+        if pending == -1:
+            pending = max(scan_end, len(logs) - len(begin_marker) + 1)
+        self._log_scan_offset = pending
+        return len(spans)
+
     def exec_bash(
         self,
         command: str,
@@ -133,15 +195,14 @@ class DockerSession(BaseSession):
             if command != "":
                 self._env.tmux_send_keys(command, enter=True)
         
-        # 等待命令完成
+        # 等待命令完成（指数退避轮询：快速命令几十毫秒内返回，长时间命令减少轮询次数）
         start_time = time.time()
-        poll_interval = 0.5
+        poll_interval = _POLL_INTERVAL_MIN
         self._prev_command_status = "timeout"
         
         while time.time() - start_time < timeout:
             logs = self._env.get_tmux_logs()
-            matches = list(PS1_PATTERN.finditer(logs))
-            ps1_count = len(matches)
+            ps1_count = self._scan_ps1(logs)
             
             if ps1_count > self._last_ps1_count:
                 # 命令完成
@@ -149,11 +210,16 @@ class DockerSession(BaseSession):
                 break
             
             time.sleep(poll_interval)
+            poll_interval = min(poll_interval * _POLL_BACKOFF, _POLL_INTERVAL_MAX)
         
-        # 解析输出
-        logs = self._env.get_tmux_logs()
-        matches = list(PS1_PATTERN.finditer(logs))
-        ps1_count = len(matches)
+        if self._prev_command_status == "timeout":
+            # 超时：最后一次轮询之后可能还有新输出，重新获取一次日志
+            logs = self._env.get_tmux_logs()
+            ps1_count = self._scan_ps1(logs)
+        # 命令完成时直接使用最后一次轮询得到的日志，不再重复获取
+        
+        # 解析输出（PS1 块位置来自增量扫描，不再对完整日志重新匹配）
+        spans = self._ps1_spans
         
         output = ""
         exit_code = -1
@@ -161,17 +227,16 @@ class DockerSession(BaseSession):
         
         if ps1_count > self._last_ps1_count:
             # 提取最后一个命令的输出
+            curr_start = spans[ps1_count - 1][0]
             if self._last_ps1_count > 0:
-                prev_match = matches[self._last_ps1_count - 1]
-                curr_match = matches[ps1_count - 1]
-                output = logs[prev_match.end():curr_match.start()]
+                prev_end = spans[self._last_ps1_count - 1][1]
+                output = logs[prev_end:curr_start]
             else:
-                curr_match = matches[ps1_count - 1]
-                output = logs[:curr_match.start()]
+                output = logs[:curr_start]
             
             # 解析元数据
             try:
-                metadata = BashMetadata.from_json(matches[-1].group(1))
+                metadata = _parse_ps1(self._last_ps1_json)
                 exit_code = metadata.exit_code
                 working_dir = metadata.working_dir
             except Exception:
@@ -180,14 +245,15 @@ class DockerSession(BaseSession):
             self._last_ps1_count = ps1_count
         else:
             # 超时，获取部分输出
-            if self._last_ps1_count > 0 and matches:
-                prev_match = matches[self._last_ps1_count - 1]
-                output = logs[prev_match.end():]
+            if 0 < self._last_ps1_count <= ps1_count:
+                prev_end = spans[self._last_ps1_count - 1][1]
+                output = logs[prev_end:]
         
-        # 清理输出
-        output = output.strip()
-        if command and output.startswith(command):
-            output = output[len(command):].strip()
+        # 清理输出：跳过开头空白和命令回显后只切片一次，避免产生多个中间字符串
+        start = _LEADING_WHITESPACE.match(output).end()
+        if command and output.startswith(command, start):
+            start = _LEADING_WHITESPACE.match(output, start + len(command)).end()
+        output = output[start:].rstrip()
         
         # 构建结果
         result = {
@@ -204,6 +270,72 @@ class DockerSession(BaseSession):
         
         return result
 
+    def exec_bash_many(
+        self,
+        commands: list[str],
+        timeout: int | None = None,
+    ) -> list[dict[str, Any]]:
+        """在一次 tmux 往返中依次执行多条互相独立的命令
+        
+        每条命令通过 eval 执行，之后用 printf 输出独占一行、带序号和退出码的分隔标记，
+        再按标记拆分输出。包含换行的命令无法拼接为一行，此时回退为逐条执行。
+        """
+        if len(commands) <= 1 or any("\n" in command for command in commands):
+            return super().exec_bash_many(commands, timeout)
+        
+        script = "; ".join(
+            f"eval {shlex.quote(command)}; printf '\\n{_BATCH_MARKER}{i}:%d\\n' $?"
+            for i, command in enumerate(commands)
+        )
+        batch_result = self.exec_bash(script, timeout)
+        output = batch_result.get("output", "")
+        working_dir = batch_result.get("working_dir", "")
+        
+        results: list[dict[str, Any]] = []
+        start = 0
+        for match in _BATCH_MARKER_PATTERN.finditer(output):
+            if int(match.group(1)) != len(results):
+                continue
+            command_output = output[start:match.start()].strip()
+            results.append({
+                "stdout": command_output,
+                "stderr": "",
+                "exit_code": int(match.group(2)),
+                "working_dir": working_dir,
+                "output": command_output,
+            })
+            start = match.end()
+        
+        if len(results) < len(commands):
+            # 第一条未完成的命令带上剩余输出。超时时整批命令仍在 session 中继续执行，
+            # 之后的命令稍后仍会执行，只能标记为待定；批量执行已结束（如 shell 被中断）
+            # 时之后的命令确实没有执行
+            remaining = output[start:].strip()
+            results.append({
+                "stdout": remaining + batch_result["stdout"][len(output):],
+                "stderr": "",
+                "exit_code": -1,
+                "working_dir": working_dir,
+                "output": remaining,
+            })
+            if self._prev_command_status == "timeout":
+                pending_message = (
+                    "[Pending: the batch is still running in the session and this command may still run. "
+                    "Use is_input=true to check its output.]"
+                )
+            else:
+                pending_message = "[Not executed: a previous command in the batch did not finish]"
+            for _ in range(len(results), len(commands)):
+                results.append({
+                    "stdout": pending_message,
+                    "stderr": "",
+                    "exit_code": -1,
+                    "working_dir": working_dir,
+                    "output": "",
+                })
+        
+        return results
+
     def upload(self, local_path: str, remote_path: str) -> None:
         """上传文件到容器
         
@@ -234,6 +366,16 @@ class DockerSession(BaseSession):
         
         self._env.write_file_content(remote_path, content, encoding)
     
+    def write_bytes(self, remote_path: str, data: bytes) -> None:
+        """写入字节内容到远程文件
+        
+        如果路径在挂载的卷中，直接在宿主机写入；否则直接写入容器，不经过临时文件。
+        """
+        if not self._is_open:
+            raise RuntimeError("Session not open")
+        
+        self._env.write_file_bytes(remote_path, data)
+    
     def download(self, remote_path: str, timeout: int | None = None) -> bytes:
         """从容器下载文件
         
@@ -244,6 +386,16 @@ class DockerSession(BaseSession):
         
         return self._env.download_file(remote_path, timeout)
     
+    def stat_path(self, remote_path: str) -> tuple[bool, bool, bool]:
+        """一次性检查远程路径是否存在、是否是文件、是否是目录
+        
+        如果路径在挂载的卷中，直接在宿主机检查。
+        """
+        if not self._is_open:
+            raise RuntimeError("Session not open")
+        
+        return self._env.stat_path(remote_path)
+    
     def path_exists(self, remote_path: str) -> bool:
         """检查远程路径是否存在
         
@@ -134,6 +134,13 @@ class LocalSession(BaseSession):
         
         self._env.write_file_content(remote_path, content, encoding)
     
+    def write_bytes(self, remote_path: str, data: bytes) -> None:
+        """写入字节内容到远程文件"""
+        if not self._is_open:
+            raise RuntimeError("Session not open")
+        
+        self._env.write_file_bytes(remote_path, data)
+    
     def download(self, remote_path: str, timeout: int | None = None) -> bytes:
         """从本地环境下载文件"""
         if not self._is_open:
@@ -141,6 +148,13 @@ class LocalSession(BaseSession):
         
         return self._env.download_file(remote_path, timeout)
     
+    def stat_path(self, remote_path: str) -> tuple[bool, bool, bool]:
+        """一次性检查远程路径是否存在、是否是文件、是否是目录"""
+        if not self._is_open:
+            raise RuntimeError("Session not open")
+        
+        return self._env.stat_path(remote_path)
+    
     def path_exists(self, remote_path: str) -> bool:
         """检查远程路径是否存在"""
         if not self._is_open:
@@ -75,6 +75,30 @@ class MockSession(BaseSession):
         return b""
 
 
+def ps1_block(exit_code=0, working_dir="/workspace"):
+    """构造一个 tmux 日志中的 PS1 块"""
+    return (
+        f'\n===PS1JSONBEGIN===\n{{"pid": "", "exit_code": "{exit_code}", '
+        f'"working_dir": "{working_dir}"}}\n===PS1JSONEND===\n'
+    )
+
+
+class FakeTmuxEnv:
+    """模拟 DockerEnv 的 tmux 日志：每次发送命令时追加预设的终端输出和一个 PS1 块"""
+
+    is_ready = True
+
+    def __init__(self):
+        self.logs = ps1_block()
+        self.outputs = []  # 每次发送命令后追加到日志中的原始输出（含命令回显）
+
+    def get_tmux_logs(self):
+        return self.logs
+
+    def tmux_send_keys(self, keys, enter=True):
+        self.logs += self.outputs.pop(0) + ps1_block()
+
+
 class TestAgentContextManagement(unittest.TestCase):
     """测试 Agent 的 Context 管理功能"""
     
@@ -222,9 +246,9 @@ class TestAgentContextManagement(unittest.TestCase):
         """测试获取对话历史"""
         agent = self.create_agent()
         
-        # 初始化前应该返回空列表
+        # 初始化前应该返回空元组
         history = agent.get_conversation_history()
-        self.assertEqual(history, [])
+        self.assertEqual(history, ())
         
         # 初始化后应该有消息
         agent._initialize(self.task)
@@ -425,6 +449,68 @@ class TestAgentContextManagement(unittest.TestCase):
         # 所以应该保留约 1 (system) + 3*3 = 10 条消息左右
         self.assertLessEqual(len(truncated.messages), 15)  # 允许一些误差
     
+    def test_context_manager_truncate_compaction_strategy(self):
+        """测试截断策略：COMPACTION（删除历史工具输出中的低信息量行）"""
+        context_config = ContextConfig(
+            max_tokens=100000,
+            truncation_strategy=TruncationStrategy.COMPACTION,
+            preserve_recent_turns=1
+        )
+        agent = self.create_agent(context_config)
+        agent._initialize(self.task)
+
+        noisy_output = "\n".join([
+            "Cloning into 'repo'...",
+            "Receiving objects: 100% (10/10), done.",
+            "Collecting numpy",
+            "Collecting numpy",
+            "ERROR: Could not find a version that satisfies numpy",
+            "Traceback (most recent call last):",
+        ])
+        agent.add_tool_message(noisy_output, "call_0", "execute_bash")
+        for i in range(3):
+            agent.add_assistant_message(f"助手消息 {i}")
+            agent.add_user_message(f"用户消息 {i}")
+
+        dialog = agent.get_current_dialog()
+        truncated = agent.context_manager.truncate(dialog)
+
+        # 消息数量不变，只精简工具输出，保留的行原样不变
+        self.assertEqual(len(truncated.messages), len(dialog.messages))
+        self.assertEqual(truncated.meta.get("strategy"), "compaction")
+        tool_message = truncated.messages[2]
+        self.assertIsInstance(tool_message, ToolMessage)
+        self.assertEqual(tool_message.tool_call_id, "call_0")
+        self.assertEqual(
+            tool_message.content,
+            "ERROR: Could not find a version that satisfies numpy\nTraceback (most recent call last):"
+        )
+        # 原对话不被修改
+        self.assertEqual(dialog.messages[2].content, noisy_output)
+        # 再次截断复用同一个精简副本
+        self.assertIs(agent.context_manager.truncate(dialog).messages[2], tool_message)
+
+        # 保留行的行尾（包括 \r\n 和结尾换行）原样不变
+        from evomaster.agent.context import _compact_text
+        self.assertEqual(
+            _compact_text("Collecting numpy\r\nok\r\n\r\n\r\nok\r\ndone\n"),
+            "ok\r\n\r\nok\r\ndone\n",
+        )
+
+    def test_context_manager_register_strategy(self):
+        """测试注册自定义截断策略"""
+        context_config = ContextConfig(truncation_strategy=TruncationStrategy.SUMMARY)
+        agent = self.create_agent(context_config)
+        agent._initialize(self.task)
+
+        agent.context_manager.register_strategy(
+            TruncationStrategy.SUMMARY,
+            lambda dialog: dialog.with_messages(dialog.messages[:1], strategy="custom"),
+        )
+        truncated = agent.context_manager.truncate(agent.get_current_dialog())
+        self.assertEqual(len(truncated.messages), 1)
+        self.assertEqual(truncated.meta["strategy"], "custom")
+
     def test_context_manager_truncate_summary_strategy(self):
         """测试截断策略：SUMMARY（回退到 latest_half）"""
         context_config = ContextConfig(
@@ -466,6 +552,95 @@ class TestAgentContextManagement(unittest.TestCase):
         tokens = agent.context_manager.estimate_tokens(dialog)
         self.assertIsInstance(tokens, int)
         self.assertGreaterEqual(tokens, 0)
+
+    def test_context_manager_caches_message_tokens(self):
+        """测试每条消息只计数一次"""
+        from evomaster.agent.context import SimpleTokenCounter
+
+        token_counter = SimpleTokenCounter()
+        token_counter.count_message = Mock(wraps=token_counter.count_message)
+        agent = self.create_agent()
+        agent.context_manager.set_token_counter(token_counter)
+        agent._initialize(self.task)
+
+        dialog = agent.get_current_dialog()
+        tokens = agent.context_manager.estimate_tokens(dialog)
+        self.assertEqual(tokens, sum(token_counter.count_message(m) for m in dialog.messages))
+        token_counter.count_message.reset_mock()
+
+        # 再次估算不重新计数，新增消息只计数一次
+        agent.add_user_message("x" * 100)
+        agent.context_manager.estimate_tokens(dialog)
+        agent.context_manager.estimate_tokens(dialog)
+        self.assertEqual(token_counter.count_message.call_count, 1)
+
+        # 新的对话对象（如截断后的对话）用 count_dialog 整段计数，不逐条计数
+        token_counter.count_message.reset_mock()
+        token_counter.count_dialog = Mock(wraps=token_counter.count_dialog)
+        copied = dialog.with_messages(list(dialog.messages))
+        self.assertEqual(
+            agent.context_manager.estimate_tokens(copied),
+            sum(token_counter.count_message(m) for m in dialog.messages),
+        )
+        token_counter.count_dialog.assert_called_once_with(copied)
+        self.assertEqual(token_counter.count_message.call_count, len(dialog.messages))
+
+    def test_context_manager_subclassed_simple_token_counter(self):
+        """测试覆盖了 count_text 的 SimpleTokenCounter 子类按其单条计数估算"""
+        from evomaster.agent.context import SimpleTokenCounter
+
+        class WordTokenCounter(SimpleTokenCounter):
+            def count_text(self, text: str) -> int:
+                return len(text.split())
+
+        token_counter = WordTokenCounter()
+        agent = self.create_agent()
+        agent.context_manager.set_token_counter(token_counter)
+        agent._initialize(self.task)
+        agent.add_user_message("one two three " * 20)
+
+        dialog = agent.get_current_dialog()
+        expected = sum(token_counter.count_message(m) for m in dialog.messages)
+        self.assertEqual(token_counter.count_dialog(dialog), expected)
+        # 新对话对象（增量状态未命中）与增量累计的结果一致
+        self.assertEqual(agent.context_manager.estimate_tokens(dialog.with_messages(list(dialog.messages))), expected)
+        agent.add_user_message("four five")
+        self.assertEqual(agent.context_manager.estimate_tokens(dialog), expected + 2 + 4)
+
+    def test_context_manager_cached_tokens(self):
+        """测试与上次查询相同的前缀计为缓存 token"""
+        context_config = ContextConfig(max_tokens=400, cached_token_discount=1.0)
+        agent = self.create_agent(context_config)
+        agent._initialize(self.task)
+        context_manager = agent.context_manager
+
+        dialog = agent.get_current_dialog()
+        agent.add_user_message("x" * 1000)
+        first = context_manager.prepare_for_query(dialog)
+        self.assertEqual(first.meta["cached_tokens"], 0)
+        # 传入的对话不被修改
+        self.assertNotIn("cached_tokens", dialog.meta)
+        first_tokens = context_manager.estimate_tokens(dialog)
+
+        # 上次发送的对话整体成为缓存前缀，按折扣计入后不需要截断
+        agent.add_user_message("y" * 800)
+        self.assertEqual(context_manager.estimate_cached_tokens(dialog), first_tokens)
+        self.assertFalse(context_manager.should_truncate(dialog))
+        context_manager.config.cached_token_discount = 0.0
+        self.assertTrue(context_manager.should_truncate(dialog))
+
+        # 中间的消息被替换（如 COMPACTION 生成的副本）时，只计算替换位置之前的前缀
+        messages = list(dialog.messages)
+        messages[1] = messages[1].model_copy()
+        replaced = dialog.with_messages(messages)
+        self.assertEqual(
+            context_manager.estimate_cached_tokens(replaced),
+            context_manager.estimate_tokens(dialog.with_messages(messages[:1])),
+        )
+
+        # 未配置折扣时 prepare_for_query 不做缓存前缀的计数，也不修改 meta
+        second = context_manager.prepare_for_query(dialog)
+        self.assertNotIn("cached_tokens", second.meta)
     
     def test_set_next_user_request(self):
         """测试 set_next_user_request 方法"""
@@ -666,6 +841,300 @@ class TestAgentContextManagement(unittest.TestCase):
         # 应该保留原始的 meta
         self.assertEqual(prepared.meta.get("custom_key"), "custom_value")
 
+    def test_trajectory_file_append_jsonl(self):
+        """测试轨迹文件以 JSONL 格式逐步追加"""
+        from evomaster.agent.agent import BaseAgent
+
+        trajectory_file = Path(self.tmpdir) / "trajectories" / "trajectory.jsonl"
+        BaseAgent.set_trajectory_file_path(trajectory_file)
+        try:
+            agent = self.create_agent()
+            agent._initialize(self.task)
+            agent._step()
+            agent.add_user_message("继续")
+            agent._step()
+
+            # 每个 step 一行（先等待后台线程写完）
+            BaseAgent.flush_trajectory_file()
+            lines = trajectory_file.read_text(encoding="utf-8").splitlines()
+            self.assertEqual(len(lines), 2)
+
+            entries = BaseAgent.load_trajectory_file()
+            self.assertEqual(len(entries), 2)
+            self.assertEqual(entries[0]["steps"], 1)
+            self.assertEqual(entries[1]["steps"], 2)
+            self.assertEqual(
+                entries[1]["trajectory"]["steps"][0]["assistant_message"]["content"],
+                "Mock response"
+            )
+        finally:
+            BaseAgent._trajectory_file_path = None
+
+    def test_trajectory_writer_restarts_after_shutdown(self):
+        """测试写入线程停止后提交的轨迹不会丢失"""
+        from evomaster.agent.agent import BaseAgent
+
+        trajectory_file = Path(self.tmpdir) / "trajectory.jsonl"
+        BaseAgent._submit_trajectory_line(trajectory_file, b'{"steps": 1}\n')
+        BaseAgent.shutdown_trajectory_writer()
+        BaseAgent._submit_trajectory_line(trajectory_file, b'{"steps": 2}\n')
+        BaseAgent.flush_trajectory_file()
+
+        self.assertEqual(
+            [entry["steps"] for entry in BaseAgent.load_trajectory_file(trajectory_file)],
+            [1, 2],
+        )
+
+    def test_dump_dialog_uses_message_cache(self):
+        """测试轨迹序列化复用已缓存的消息"""
+        agent = self.create_agent()
+        agent._initialize(self.task)
+        agent.add_assistant_message("回复")
+
+        dialog = agent.get_current_dialog()
+        dumped = agent._dump_dialog(dialog)
+        # 与 Dialog.model_dump() 的结果一致
+        self.assertEqual(dumped, dialog.model_dump())
+        # 同一条消息只序列化一次
+        first = dumped["messages"][0]
+        self.assertIs(agent._dump_dialog(dialog)["messages"][0], first)
+
+        # 追加消息后只序列化新增部分，结果仍与完整序列化一致，已返回的结果不受影响
+        num_dumped = len(dumped["messages"])
+        agent.add_user_message("继续")
+        self.assertEqual(agent._dump_dialog(dialog), dialog.model_dump())
+        self.assertEqual(len(dumped["messages"]), num_dumped)
+        # 重置后的新对话重新构建
+        agent.reset_context()
+        new_dialog = agent.get_current_dialog()
+        self.assertEqual(agent._dump_dialog(new_dialog), new_dialog.model_dump())
+
+    def test_step_executes_tool_calls_in_order(self):
+        """测试工具调用按原顺序执行并写回，finish 之后的调用不执行"""
+        from evomaster.agent.tools.builtin.think import ThinkTool
+
+        self.tools.register(ThinkTool())
+        tool_calls = [
+            ToolCall(id=f"call_{i}", function=FunctionCall(name=name, arguments=args))
+            for i, (name, args) in enumerate([
+                ("think", '{"thought": "a"}'),
+                ("unknown_tool", "{}"),
+                ("think", '{"thought": "b"}'),
+                ("think", '{"thought": "c"}'),
+                ("finish", '{"message": "done", "task_completed": "true"}'),
+                ("think", '{"thought": "d"}'),
+            ])
+        ]
+        self.llm.query = Mock(return_value=AssistantMessage(content="", tool_calls=tool_calls))
+
+        agent = self.create_agent()
+        agent._initialize(self.task)
+        self.assertTrue(agent._step())
+
+        responses = agent.trajectory.steps[-1].tool_responses
+        self.assertEqual([m.tool_call_id for m in responses], ["call_0", "call_1", "call_2", "call_3"])
+        self.assertEqual(responses[1].meta["info"], {"error": "tool_not_found"})
+
+    def test_step_runs_consecutive_mcp_calls_concurrently(self):
+        """测试连续的 MCP 工具调用并发执行，结果仍按原顺序写回"""
+        import asyncio
+        import threading
+        from evomaster.agent.tools.builtin.think import ThinkTool
+        from evomaster.agent.tools.mcp.mcp import MCPTool
+
+        class SlowConnection:
+            """每次调用耗时 0.2 秒，并记录同时进行的调用数"""
+
+            def __init__(self):
+                self.active = 0
+                self.max_active = 0
+
+            async def call_tool(self, name, args):
+                self.active += 1
+                self.max_active = max(self.max_active, self.active)
+                await asyncio.sleep(0.2)
+                self.active -= 1
+                return f"{name}:{args['q']}"
+
+        loop = asyncio.new_event_loop()
+        loop_thread = threading.Thread(target=loop.run_forever, daemon=True)
+        loop_thread.start()
+        try:
+            connection = SlowConnection()
+            tool = MCPTool(connection, "search", "Search", {}, remote_tool_name="search")
+            tool._mcp_loop = loop
+            self.tools.register(tool)
+            self.tools.register(ThinkTool())
+
+            tool_calls = [
+                ToolCall(id=f"call_{i}", function=FunctionCall(name=name, arguments=args))
+                for i, (name, args) in enumerate([
+                    ("search", '{"q": "a"}'),
+                    ("search", '{"q": "b"}'),
+                    ("search", '{"q": "c"}'),
+                    ("think", '{"thought": "t"}'),
+                    ("search", '{"q": "d"}'),
+                ])
+            ]
+            self.llm.query = Mock(return_value=AssistantMessage(content="", tool_calls=tool_calls))
+            agent = self.create_agent()
+            agent._initialize(self.task)
+            agent._step()
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            loop_thread.join()
+            loop.close()
+
+        responses = agent.trajectory.steps[-1].tool_responses
+        self.assertEqual([m.tool_call_id for m in responses], [f"call_{i}" for i in range(5)])
+        self.assertEqual(
+            [m.content for i, m in enumerate(responses) if i != 3],
+            ["search:a", "search:b", "search:c", "search:d"],
+        )
+        # think 之前连续的三个调用同时进行
+        self.assertEqual(connection.max_active, 3)
+
+    def test_docker_session_scan_ps1_incremental(self):
+        """测试增量扫描 PS1 块与对完整日志重新匹配的结果一致"""
+        from evomaster.agent.session.docker import DockerSession
+        from evomaster.env.docker import PS1_PATTERN
+
+        logs = (
+            ps1_block()
+            + "echo a\na\n" + ps1_block(0)
+            + "false\n" + ps1_block(1, "/tmp")
+            + "sleep 10\npartial output" + ps1_block(0, "/root")
+            + "tail\n===PS1JSONBEGIN===\n{unclosed"
+        )
+        for step in (1, 3, 7, 19):
+            session = DockerSession()
+            session._env = FakeTmuxEnv()
+            # 日志逐步增长（开始、结束标记可能跨越两次读取）
+            for end in list(range(0, len(logs), step)) + [len(logs)]:
+                prefix = logs[:end]
+                expected = list(PS1_PATTERN.finditer(prefix))
+                self.assertEqual(session._scan_ps1(prefix), len(expected))
+                self.assertEqual(session._ps1_spans, [m.span() for m in expected])
+                if expected:
+                    self.assertEqual(session._last_ps1_json, expected[-1].group(1))
+
+            # 日志变短（被截断或重建）时从头扫描
+            shorter = logs[:len(logs) // 3]
+            expected = list(PS1_PATTERN.finditer(shorter))
+            self.assertEqual(session._scan_ps1(shorter), len(expected))
+            self.assertEqual(session._ps1_spans, [m.span() for m in expected])
+
+    def test_docker_session_exec_bash_strips_command_echo(self):
+        """测试 exec_bash 去除命令回显和首尾空白，结果与 strip/切片/strip 的写法一致"""
+        from evomaster.agent.session.docker import DockerSession
+
+        def legacy_clean(output, command):
+            output = output.strip()
+            if command and output.startswith(command):
+                output = output[len(command):].strip()
+            return output
+
+        cases = [
+            # (命令, 两个 PS1 块之间的原始输出, 期望结果)
+            ("echo hi", "echo hi\nhi\n", "hi"),
+            ("echo hi", "  \n echo hi\r\n  hi  \n\n", "hi"),
+            ("true", "true\n   \n", ""),
+            ("true", "true", ""),
+            ("  echo hi  ", "echo hi\nhi", "hi"),
+            ("cat <<EOF\nx\nEOF", "cat <<EOF\nx\nEOF\nx\n", "x"),
+            ("ls", "\nfile1\nls\n", "file1\nls"),
+        ]
+        session = DockerSession()
+        session._env = FakeTmuxEnv()
+        session.open()
+        for command, raw, expected in cases:
+            with self.subTest(command=command, raw=raw):
+                session._env.outputs.append(raw)
+                result = session.exec_bash(command)
+                self.assertEqual(result["output"], expected)
+                self.assertEqual(result["output"], legacy_clean(raw, command.strip()))
+                self.assertEqual(result["exit_code"], 0)
+                self.assertEqual(result["working_dir"], "/workspace")
+
+    def test_tool_specs_cached_until_registry_changes(self):
+        """测试工具规格在注册中心变化前被缓存"""
+        from evomaster.agent.tools.builtin.think import ThinkTool
+
+        self.tools.register(ThinkTool())
+        agent = self.create_agent()
+        agent.enable_tools = True
+
+        specs = agent._get_tool_specs()
+        self.assertEqual([spec.function.name for spec in specs], ["think"])
+        self.assertIs(agent._get_tool_specs(), specs)
+
+        # 取消注册后缓存失效
+        self.tools.unregister("think")
+        self.assertEqual(agent._get_tool_specs(), [])
+
+    def test_docker_session_exec_bash_many(self):
+        """测试批量执行按分隔标记拆分输出，输出不以换行结尾时也能正确拆分"""
+        import subprocess
+        from evomaster.agent.session.docker import DockerSession
+
+        class LocalBashSession(DockerSession):
+            """用本地 bash 代替 tmux 执行命令的 DockerSession"""
+
+            def __init__(self):
+                super().__init__()
+                self.scripts = []
+                # 设置后模拟超时：输出截断到该文本为止，命令仍在 session 中运行
+                self.timeout_after = None
+
+            def exec_bash(self, command, timeout=None, is_input=False):
+                self.scripts.append(command)
+                result = subprocess.run(["bash", "-c", command], capture_output=True, text=True)
+                output = result.stdout.strip()
+                if self.timeout_after is None:
+                    self._prev_command_status = "completed"
+                    return {"stdout": output, "stderr": "", "exit_code": result.returncode,
+                            "working_dir": "/", "output": output}
+                self._prev_command_status = "timeout"
+                output = output[:output.index(self.timeout_after) + len(self.timeout_after)]
+                return {"stdout": output + "\n[Command timed out after 1s]", "stderr": "",
+                        "exit_code": -1, "working_dir": "", "output": output}
+
+        session = LocalBashSession()
+        results = session.exec_bash_many([
+            "printf abc",
+            "true",
+            "echo 'line 1'; echo 'line 2'",
+            "printf 'no newline'; false",
+            "exit 3",
+            "echo never",
+        ])
+
+        # 所有命令在一次 exec_bash 中执行
+        self.assertEqual(len(session.scripts), 1)
+        self.assertEqual(
+            [(r["output"], r["exit_code"]) for r in results[:4]],
+            [("abc", 0), ("", 0), ("line 1\nline 2", 0), ("no newline", 1)],
+        )
+        # exit 中断了批量执行：该命令没有退出码，之后的命令未执行
+        self.assertEqual(results[4]["exit_code"], -1)
+        self.assertEqual(results[5]["exit_code"], -1)
+        self.assertIn("Not executed", results[5]["stdout"])
+
+        # 超时：未完成的命令带上已有输出，之后的命令仍可能执行，标记为待定而不是未执行
+        session.timeout_after = "partial"
+        results = session.exec_bash_many(["echo a", "echo partial; echo rest", "echo later"])
+        self.assertEqual([(r["output"], r["exit_code"]) for r in results[:2]], [("a", 0), ("partial", -1)])
+        self.assertIn("[Command timed out after 1s]", results[1]["stdout"])
+        self.assertIn("Pending", results[2]["stdout"])
+        self.assertNotIn("Not executed", results[2]["stdout"])
+        session.timeout_after = None
+
+        # 单条命令或包含换行的命令回退为逐条执行
+        session.scripts.clear()
+        results = session.exec_bash_many(["echo a", "echo 'b\nc'"])
+        self.assertEqual(session.scripts, ["echo a", "echo 'b\nc'"])
+        self.assertEqual([r["output"] for r in results], ["a", "b\nc"])
+
 
 if __name__ == "__main__":
     unittest.main()
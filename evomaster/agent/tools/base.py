@@ -77,6 +77,9 @@ class BaseTool(ABC):
     
     # 参数类
     params_class: ClassVar[type[BaseToolParams]]
+
+    # 是否可与其他 concurrent_safe 工具并发执行（不使用 session、没有共享可变状态的工具可设为 True）
+    concurrent_safe: ClassVar[bool] = False
     
     def __init__(self):
         self.logger = logging.getLogger(self.__class__.__name__)
@@ -131,6 +134,8 @@ class ToolRegistry:
     def __init__(self):
         self._tools: dict[str, BaseTool] = {}
         self.logger = logging.getLogger(self.__class__.__name__)
+        # 版本号，注册/取消注册工具后递增，供调用方判断缓存是否失效
+        self._version = 0
 
     def register(self, tool: BaseTool) -> None:
         """注册工具
@@ -141,6 +146,7 @@ class ToolRegistry:
         if tool.name in self._tools:
             self.logger.warning(f"Tool {tool.name} already registered, overwriting")
         self._tools[tool.name] = tool
+        self._version += 1
         self.logger.debug(f"Registered tool: {tool.name}")
 
     def register_many(self, tools: list[BaseTool]) -> None:
@@ -152,8 +158,14 @@ class ToolRegistry:
         """取消注册工具"""
         if name in self._tools:
             del self._tools[name]
+            self._version += 1
             self.logger.debug(f"Unregistered tool: {name}")
 
+    @property
+    def version(self) -> int:
+        """注册中心版本号，每次注册或取消注册工具后递增"""
+        return self._version
+
     def get_tool(self, name: str) -> BaseTool | None:
         """获取工具
         
@@ -150,21 +150,16 @@ class EditorTool(BaseTool):
         if not Path(path).is_absolute():
             raise ToolParameterError("path", path, "The path should be an absolute path, starting with `/`.")
         
-        # 检查路径类型（优先检查目录，因为目录检查更可靠）
-        if session.is_directory(path):
+        # 检查路径类型（一次获取存在性、文件、目录三项结果；优先判断目录）
+        exists, is_file, is_dir = session.stat_path(path)
+        if is_dir:
             path_type = "dir"
-        elif session.is_file(path):
+        elif is_file:
+            path_type = "file"
+        elif exists:
+            # 路径存在但既不是文件也不是目录（如特殊文件），
+            # 默认当作文件处理（但会在使用时再次检查）
             path_type = "file"
-        elif session.path_exists(path):
-            # 如果路径存在但既不是文件也不是目录，再次检查
-            # 可能是符号链接或其他特殊类型，尝试判断实际类型
-            if session.is_directory(path):
-                path_type = "dir"
-            elif session.is_file(path):
-                path_type = "file"
-            else:
-                # 未知类型，默认当作文件处理（但会在使用时再次检查）
-                path_type = "file"
         else:
             path_type = "not_exist"
         
@@ -174,12 +169,11 @@ class EditorTool(BaseTool):
         
         # 对于 create 命令，需要更严格的检查
         if command == "create":
-            # 再次确认路径不存在（防止误判）
-            if session.is_file(path):
+            if is_file:
                 raise ToolParameterError("path", path, f"File already exists at: {path}. Cannot overwrite files using command `create`.")
-            if session.is_directory(path):
+            if is_dir:
                 raise ToolParameterError("path", path, f"The path {path} is a directory. Cannot create a file with the same name as a directory.")
-            if session.path_exists(path):
+            if exists:
                 # 路径存在但不是文件也不是目录，可能是其他类型（如符号链接）
                 raise ToolParameterError("path", path, f"Path already exists at: {path}. Cannot overwrite using command `create`.")
         
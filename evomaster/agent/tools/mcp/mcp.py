@@ -9,6 +9,7 @@ import asyncio
 import concurrent.futures
 import json
 import logging
+import threading
 from typing import TYPE_CHECKING, Any, ClassVar
 
 from ..base import BaseTool, ToolError
@@ -17,6 +18,9 @@ if TYPE_CHECKING:
     from evomaster.agent.session import BaseSession
     from evomaster.utils.types import ToolSpec
 
+# MCP loop 未在后台运行时，run_until_complete 不能由多个线程同时进行，需要串行
+_loop_run_lock = threading.Lock()
+
 
 class MCPTool(BaseTool):
     """MCP 工具包装器
@@ -42,6 +46,8 @@ class MCPTool(BaseTool):
     # 类属性（BaseTool 需要）
     name: ClassVar[str] = "mcp_tool"  # 会被实例属性覆盖
     params_class: ClassVar[type] = None  # MCP 工具不使用 params_class
+    # 不使用 session，调用通过网络发往 MCP 服务器，可与其他调用并发执行
+    concurrent_safe: ClassVar[bool] = True
 
     def __init__(
         self,
@@ -80,6 +86,7 @@ class MCPTool(BaseTool):
         # 统计信息
         self._call_count = 0
         self._last_error = None
+        self._stats_lock = threading.Lock()
 
     def execute(
         self,
@@ -108,15 +115,17 @@ class MCPTool(BaseTool):
             # 3. 格式化输出
             observation = self._format_mcp_result(result)
 
-            # 4. 更新统计
-            self._call_count += 1
+            # 4. 更新统计（工具可能被并发调用）
+            with self._stats_lock:
+                self._call_count += 1
+                call_count = self._call_count
             self._last_error = None
 
             info = {
                 "mcp_tool": self._tool_name,
                 "mcp_server": self._mcp_server,
                 "success": True,
-                "call_count": self._call_count,
+                "call_count": call_count,
             }
 
             return observation, info
@@ -149,8 +158,11 @@ class MCPTool(BaseTool):
 
         try:
             # 2) 如果这个 loop 当前没有在运行（最常见：同步 Agent 场景），直接 run_until_complete
-            if not loop.is_running():
-                return loop.run_until_complete(coro)
+            #    （检查和运行都在锁内：并发调用时，其他线程等待本次运行结束后再自行运行，
+            #    不会把协程提交给即将停止的 loop）
+            with _loop_run_lock:
+                if not loop.is_running():
+                    return loop.run_until_complete(coro)
 
             # 3) 如果 loop 在运行（比如你把 loop 放到后台线程 run_forever），用线程安全提交
             fut = asyncio.run_coroutine_threadsafe(coro, loop)
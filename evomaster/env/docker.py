@@ -8,8 +8,9 @@ from __future__ import annotations
 import json
 import os
 import re
+import shlex
+import stat
 import subprocess
-import tempfile
 import time
 from pathlib import Path
 from typing import Any
@@ -37,6 +38,19 @@ PS1_PATTERN = re.compile(
 )
 
 
+# download_file 读取目录时使用的退出码（EISDIR）
+_EXIT_IS_DIRECTORY = 21
+
+
+def _stat_host_path(host_path: str) -> tuple[bool, bool, bool]:
+    """通过一次 os.stat 检查宿主机路径 (是否存在, 是否是文件, 是否是目录)"""
+    try:
+        st = os.stat(host_path)
+    except (OSError, ValueError):
+        return False, False, False
+    return True, stat.S_ISREG(st.st_mode), stat.S_ISDIR(st.st_mode)
+
+
 class BashMetadata:
     """Bash 执行元数据"""
     
@@ -581,32 +595,22 @@ class DockerEnv(BaseEnv):
             except Exception as e:
                 raise RuntimeError(f"Failed to download file {remote_path} from host: {e}")
 
-        # 不在挂载卷中，使用 docker cp
-        # 检查路径是否是目录，docker cp 不能复制目录
-        if self.is_directory(remote_path):
-            raise RuntimeError(f"Cannot download directory: {remote_path}. Use exec_bash to list directory contents instead.")
-
+        # 不在挂载卷中，通过 docker exec 直接读取 stdout
+        # 目录检查与读取合并为一次调用，不经过宿主机临时文件和 docker cp
         timeout = timeout or 60
 
-        with tempfile.NamedTemporaryFile(delete=False) as f:
-            temp_path = f.name
-
-        try:
-            cmd = ["docker", "cp", f"{self._container_id}:{remote_path}", temp_path]
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        quoted_path = shlex.quote(remote_path)
+        command = f"if [ -d {quoted_path} ]; then exit {_EXIT_IS_DIRECTORY}; fi; cat {quoted_path}"
+        cmd = ["docker", "exec", self._container_id, "bash", "-c", command]
+        result = subprocess.run(cmd, capture_output=True, timeout=timeout)
 
-            if result.returncode != 0:
-                # 检查错误信息中是否包含目录相关的错误
-                error_msg = result.stderr.strip()
-                if "cannot copy directory" in error_msg.lower() or "is a directory" in error_msg.lower():
-                    raise RuntimeError(f"Cannot download directory: {remote_path}. Use exec_bash to list directory contents instead.")
-                raise RuntimeError(f"Failed to download file: {error_msg}")
+        if result.returncode == _EXIT_IS_DIRECTORY:
+            raise RuntimeError(f"Cannot download directory: {remote_path}. Use exec_bash to list directory contents instead.")
+        if result.returncode != 0:
+            error_msg = result.stderr.decode("utf-8", errors="replace").strip()
+            raise RuntimeError(f"Failed to download file: {error_msg}")
 
-            with open(temp_path, "rb") as f:
-                return f.read()
-        finally:
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
+        return result.stdout
 
     def read_file_content(self, remote_path: str, encoding: str = "utf-8") -> str:
         """读取远程文件内容（文本）
@@ -662,16 +666,73 @@ class DockerEnv(BaseEnv):
                 raise RuntimeError(f"Failed to write file {remote_path} to host: {e}")
             return
 
-        # 不在挂载卷中，使用 upload_file
-        import tempfile
-        with tempfile.NamedTemporaryFile(mode="wb", delete=False) as f:
-            f.write(content.encode(encoding))
-            temp_path = f.name
+        # 不在挂载卷中，直接写入容器
+        self.write_file_bytes(remote_path, content.encode(encoding))
 
-        try:
-            self.upload_file(temp_path, remote_path)
-        finally:
-            os.unlink(temp_path)
+    def write_file_bytes(self, remote_path: str, data: bytes) -> None:
+        """写入字节内容到远程文件
+
+        如果路径在挂载的卷中，直接在宿主机写入；否则通过 docker exec 的 stdin
+        直接写入容器，不经过宿主机临时文件和 docker cp。
+
+        Args:
+            remote_path: 远程文件路径（容器内路径）
+            data: 文件内容（字节）
+        """
+        if not self._container_id:
+            raise RuntimeError("Container not started")
+
+        is_mounted, host_path = self.is_mounted_path(remote_path)
+
+        if is_mounted and host_path:
+            # 直接在宿主机写入
+            try:
+                host_path_obj = Path(host_path)
+                host_path_obj.parent.mkdir(parents=True, exist_ok=True)
+                host_path_obj.write_bytes(data)
+            except Exception as e:
+                raise RuntimeError(f"Failed to write file {remote_path} to host: {e}")
+            return
+
+        # 与 upload_file 一致：确保目录存在，写入后设置权限（777 确保所有用户都可以读写）。
+        # 权限设置尽力而为（如目录属于其他用户时 chmod 会失败），成功与否只取决于 cat。
+        remote_dir = shlex.quote(str(Path(remote_path).parent))
+        remote_file = shlex.quote(remote_path)
+        command = (
+            f"mkdir -p {remote_dir}; chmod 777 {remote_dir} 2>/dev/null; "
+            f"cat > {remote_file} && {{ chmod 777 {remote_file} 2>/dev/null || true; }}"
+        )
+        cmd = ["docker", "exec", "-i", self._container_id, "bash", "-c", command]
+        result = subprocess.run(cmd, input=data, capture_output=True, timeout=60)
+
+        if result.returncode != 0:
+            error_msg = result.stderr.decode("utf-8", errors="replace").strip()
+            raise RuntimeError(f"Failed to write file: {error_msg}")
+
+    def stat_path(self, remote_path: str) -> tuple[bool, bool, bool]:
+        """一次性检查远程路径是否存在、是否是文件、是否是目录
+
+        如果路径在挂载的卷中，直接在宿主机检查；否则三项检查合并为一次 docker exec。
+
+        Args:
+            remote_path: 远程路径（容器内路径）
+
+        Returns:
+            (是否存在, 是否是文件, 是否是目录)
+        """
+        is_mounted, host_path = self.is_mounted_path(remote_path)
+
+        if is_mounted and host_path:
+            return _stat_host_path(host_path)
+
+        # 不在挂载卷中，使用 docker exec
+        result = self.docker_exec(
+            f'test -e "{remote_path}" && echo "exists"; '
+            f'test -f "{remote_path}" && echo "file"; '
+            f'test -d "{remote_path}" && echo "dir"; true'
+        )
+        lines = {line.strip() for line in result.get("stdout", "").splitlines()}
+        return "exists" in lines, "file" in lines, "dir" in lines
 
     def path_exists(self, remote_path: str) -> bool:
         """检查远程路径是否存在
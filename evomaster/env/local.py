@@ -7,6 +7,7 @@ from __future__ import annotations
 
 import os
 import shutil
+import stat
 import subprocess
 from pathlib import Path
 from typing import Any
@@ -381,6 +382,41 @@ class LocalEnv(BaseEnv):
         with open(remote_file, "w", encoding=encoding) as f:
             f.write(content)
 
+    def write_file_bytes(self, remote_path: str, data: bytes) -> None:
+        """写入字节内容到远程文件
+
+        Args:
+            remote_path: 远程文件路径（本地环境中的路径）
+            data: 文件内容（字节）
+        """
+        if not self._is_ready:
+            raise RuntimeError("Environment not ready")
+
+        remote_file = Path(remote_path)
+
+        # 确保目录存在
+        remote_file.parent.mkdir(parents=True, exist_ok=True)
+
+        remote_file.write_bytes(data)
+
+    def stat_path(self, remote_path: str) -> tuple[bool, bool, bool]:
+        """一次性检查远程路径是否存在、是否是文件、是否是目录
+
+        Args:
+            remote_path: 远程路径（本地环境中的路径）
+
+        Returns:
+            (是否存在, 是否是文件, 是否是目录)
+        """
+        if not self._is_ready:
+            raise RuntimeError("Environment not ready")
+
+        try:
+            st = os.stat(remote_path)
+        except (OSError, ValueError):
+            return False, False, False
+        return True, stat.S_ISREG(st.st_mode), stat.S_ISDIR(st.st_mode)
+
     def path_exists(self, remote_path: str) -> bool:
         """检查远程路径是否存在
 
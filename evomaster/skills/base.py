@@ -244,6 +244,9 @@ class SkillRegistry:
         self._knowledge_skills: dict[str, KnowledgeSkill] = {}
         self._operator_skills: dict[str, OperatorSkill] = {}
 
+        # 版本号，skills 重新加载后递增，供调用方判断缓存是否失效
+        self._version = 0
+
         # 自动加载 skills
         self._load_skills()
 
@@ -273,6 +276,13 @@ class SkillRegistry:
                     except Exception as e:
                         self.logger.error(f"Failed to load operator skill from {skill_dir}: {e}")
 
+        self._version += 1
+
+    @property
+    def version(self) -> int:
+        """skills 版本号，每次加载 skills 后递增"""
+        return self._version
+
     def get_skill(self, name: str) -> BaseSkill | None:
         """获取指定名称的 skill
 
@@ -91,6 +91,27 @@ class Dialog(BaseModel):
         """添加消息到对话"""
         self.messages.append(message)
 
+    def with_messages(self, messages: list[Message], **meta_updates: Any) -> Dialog:
+        """基于当前对话构建使用新消息列表的对话
+
+        messages 就是当前消息列表且没有 meta 更新时直接返回自身。否则新对话与当前
+        对话共享 tools，并跳过校验（消息都已是校验过的模型），避免逐条重新校验消息。
+
+        Args:
+            messages: 新的消息列表（由调用方新建，新对话直接持有该列表）
+            **meta_updates: 需要更新的 meta 字段
+
+        Returns:
+            新的 Dialog 对象
+        """
+        if messages is self.messages and not meta_updates:
+            return self
+        return Dialog.model_construct(
+            messages=messages,
+            tools=self.tools,
+            meta={**self.meta, **meta_updates},
+        )
+
     def get_messages_for_api(self) -> list[dict[str, Any]]:
         """获取用于 API 调用的消息格式"""
         result = []